@@ -0,0 +1,381 @@
+"""Per-chunk cost of the reference heuristic, before and after compiling its patterns into
+one feature extractor and weight table, and the cost of split_references on a long
+reference list, before and after bounding scores from their cheap features.
+
+Usage: python bench_ref_heuristic.py [sectionized.json ...]
+
+Without arguments, a fixed set of synthetic prose, caption and reference chunks is used,
+along with random mixtures of the terms the heuristic looks for. With sectionized
+documents, the paragraphs of their last section are used instead. The old score is
+checked to agree with the new one on every chunk.
+"""
+
+import json
+import random
+import re
+import sys
+import time
+
+from climpdfgetter.ref_extraction_utils import (
+    JOURNAL_TERMS,
+    PROSE_MARKERS,
+    get_heuristic_score,
+    split_references,
+)
+
+# The implementation being replaced, kept verbatim for comparison.
+
+
+def old_get_heuristic_score(text):
+    score = 0
+    text_lower = text.lower()
+
+    # --- Strong Positive Signals (Override prose) ---
+    # DOI
+    if re.search(r"10\.\d{4,}/", text):
+        score += 8
+    # URL / Retrieval / Access
+    if (
+        "http://" in text
+        or "https://" in text
+        or "retrieved from" in text_lower
+        or "accessed:" in text_lower
+        or "accessed," in text_lower
+        or "available at:" in text_lower
+    ):
+        score += 4
+    # Citation Markers at start: "[1]" or "1."
+    if re.match(r"^\[\d+\]", text.strip()) or re.match(r"^\d+\.", text.strip()):
+        score += 6
+    # "et al."
+    if "et al." in text_lower or "et al," in text_lower:
+        score += 4
+    # Specific Pre-print/Journal indicators
+    if "arxiv" in text_lower or "ssrn" in text_lower or "proc." in text_lower:
+        score += 5
+
+    # Common reference terms / Journal Abbreviations
+    journal_terms = [
+        "journal of",
+        "trans.",
+        "intl.",
+        "conf.",
+        "univ.",
+        "press",
+        "adv.",
+        "sci.",
+        "lett.",
+        "rev.",
+        "res.",
+        "phys.",
+        "chem.",
+        "biol.",
+        "geophys.",
+        "ann.",
+        "bull.",
+        "j.",
+        "am.",
+        "soc.",
+        "ieee",
+        "acm",
+        "nature",
+        "science",
+        "cell",
+        "publishing",
+        "publisher",
+        "editors",
+        "ed.",
+        "eds.",
+        "ltd",
+        "inc",
+        "literature cited",
+        "ph.d. thesis",
+        "doctoral thesis",
+        "springer",
+    ]
+
+    # Check for whole words to avoid false matches
+    for term in journal_terms:
+        if term in text_lower:
+            score += 3
+            break  # One is enough
+
+    # --- Medium Positive Signals ---
+    # Year (1900-2029) - Context aware
+    # Matches (1999), 1999., , 1999
+    if re.search(r"[\(,]\s*(19|20)\d{2}[\)\.]", text) or re.search(r"\b(19|20)\d{2}[a-z]?\s*[\)\.]", text):
+        score += 2
+    elif re.search(r"\b(19|20)\d{2}\b", text):
+        # Raw year, less strong
+        score += 1
+
+    # Pages / Vol
+    if re.search(r"\b(vol\.|no\.|pp\.|p\.)\s*\d+", text_lower) or re.search(r"\d+\s*:\s*\d+[-–]\d+", text):
+        score += 3
+
+    # Author-like patterns
+    # "Smith, J." or "Smith, J.A."
+    if re.match(r"^[A-Z][a-z]+,\s+[A-Z]\.", text.strip()):
+        score += 3
+    # "J. Smith" or "J.A. Smith" - riskier
+    if re.match(r"^[A-Z]\.([A-Z]\.)?\s+[A-Z][a-z]+", text.strip()) and not re.match(
+        r"^(fig\.|table|vol\.|p\.|pp\.|u\.s\.)", text_lower.strip()
+    ):
+        score += 1
+
+    # --- Content Signals (Negative) ---
+    # Common Sentence Starters / Connectives
+    # REMOVED: "data", "method", "analysis", "result", "simulation" as they appear in titles
+    prose_markers = [
+        "however",
+        "therefore",
+        "although",
+        "furthermore",
+        "in conclusion",
+        "we found",
+        "results show",
+        "discussion",
+        "abstract",
+        "introduction",
+        "as shown in",
+        "the figure",
+        "the table",
+        "section",
+    ]
+
+    for marker in prose_markers:
+        if marker in text_lower:
+            # If we have strong signals (DOI, et al), ignore prose markers
+            if score < 5:
+                score -= 5
+            break
+
+    # First person - References rarely use "we" or "our" unless in title? Unlikely.
+    if re.search(r"\bwe\b", text_lower) or re.search(r"\bour\b", text_lower):
+        if score < 5:
+            score -= 3
+
+    # Figure/Table captions
+    if re.match(r"^(figure|fig\.|table|tab\.)\s*\d+", text_lower.strip()):
+        score -= 10
+
+    # Single sentence ending in period without citation features
+    # Heuristic: References are often not full sentences or are very structured.
+    # Long prose-like line that didn't trigger positive signals is suspicious.
+    if len(text.split()) > 15 and text.strip().endswith(".") and score < 2:
+        score -= 2
+
+    #  Relatively large percentage of single-character tokens resembles lists of authors
+    percentage_single_char = len([i for i in text.split(" ") if len(i) == 1]) / len(text.split(" "))
+    percentage_single_char_with_period = len([i for i in text.split(" ") if len(i) == 2 and i.endswith(".")]) / len(
+        text.split(" ")
+    )
+    if percentage_single_char + percentage_single_char_with_period > 0.10:
+        score += 3
+
+    return score
+
+
+def old_split_references(text):
+    """
+    Splits the text into (content, references).
+    Returns (content_str, references_str).
+    If no references found, references_str is None.
+    """
+    # Split by double newline (paragraphs)
+    chunks = re.split(r"\n\n+", text)
+
+    threshold = 1
+
+    split_index = len(chunks)
+
+    patience = 2
+    consecutive_low = 0
+
+    for i in range(len(chunks) - 1, -1, -1):
+        chunk = chunks[i].strip()
+        if not chunk:
+            continue
+
+        score = old_get_heuristic_score(chunk)
+
+        if score >= threshold:
+            split_index = i
+            consecutive_low = 0
+        else:
+            consecutive_low += 1
+            if consecutive_low > patience:
+                break
+
+    if split_index == len(chunks):
+        return text, None
+
+    content_chunks = chunks[:split_index]
+    ref_chunks = chunks[split_index:]
+
+    content_str = "\n\n".join(content_chunks)
+    references_str = "\n\n".join(ref_chunks)
+
+    return content_str, references_str
+
+
+SYNTHETIC_CHUNKS = [
+    "The climate of the region has been warming steadily over many decades, as shown in Figure 3.",
+    "However, we found that precipitation anomalies were larger than expected in the 1990s and our results show this.",
+    "Figure 2. Mean annual temperature trends (°C/decade) for 1981-2010.",
+    "Table 1: Station metadata",
+    "[1] Smith, J. A., and B. Jones, 2019: Heat waves in a warming world. J. Climate, 32, 1234-1250.",
+    "Smith, J., Doe, A. (2020). Weather extremes. Nature 580, 45:12-19. https://doi.org/10.1038/s41586-020-1234-5",
+    "J. Smith and A. Doe, Proc. Natl. Acad. Sci. USA 117, 2020, pp. 100-110.",
+    "U.S. Environmental Protection Agency, 2016. Climate change indicators. Retrieved from https://www.epa.gov",
+    "Doe A, Roe B, et al. Rainfall variability. arXiv:2101.00001 (2021).",
+    "12. IPCC, Climate Change 2021: The Physical Science Basis. Cambridge University Press.",
+    "Literature Cited",
+    "In conclusion, section 4 discusses the implications. " * 3,
+    "A B C D E F G H I J K",
+    "Vol. 12, no. 3",
+    "",
+    "   ",
+    "İstanbul Üniversitesi Yayınları, 1998.",
+]
+
+
+def _random_chunks(n, seed=0):
+    """Random mixtures of the heuristic's terms, digits and filler words, to exercise edge cases."""
+    rng = random.Random(seed)
+    pieces = (
+        JOURNAL_TERMS
+        + PROSE_MARKERS
+        + [
+            "10.1000/xyz",
+            "http://",
+            "https://",
+            "retrieved from",
+            "accessed:",
+            "accessed,",
+            "available at:",
+            "[3]",
+            "4.",
+            "et al.",
+            "et al,",
+            "arxiv",
+            "ssrn",
+            "proc.",
+            "(1999)",
+            "1999.",
+            ", 2005)",
+            "2012a)",
+            "2030",
+            "vol. 3",
+            "no.4",
+            "p. 7",
+            "12: 3-5",
+            "12:3–5",
+            "Smith, J.",
+            "J.A. Smith",
+            "J. Doe",
+            "fig. 2",
+            "table 3",
+            "tab. 1",
+            "figure 4",
+            "we",
+            "our",
+            "We",
+            "Our",
+            "u.s.",
+            "U.S. Army",
+            "a",
+            "b.",
+            "x",
+            ".",
+            "  ",
+            "\n",
+            "The",
+            "results",
+            "data",
+            "Proc.",
+            "ARXIV",
+            "Et Al.",
+            "İ",
+            "Σ",
+            "climate",
+            "warming",
+            "model",
+            "regional",
+            "precipitation",
+        ]
+    )
+    chunks = []
+    for _ in range(n):
+        words = rng.choices(pieces, k=rng.randint(1, 30))
+        text = " ".join(words) if rng.random() < 0.8 else "".join(words)
+        if rng.random() < 0.3:
+            text += "."
+        if rng.random() < 0.2:
+            text = " " + text + " "
+        chunks.append(text)
+    return chunks
+
+
+def _random_documents(chunks, n, seed=0):
+    rng = random.Random(seed)
+    separators = ["\n\n", "\n\n\n", "\n\n \n\n", "\n"]
+    documents = []
+    for _ in range(n):
+        parts = rng.choices(chunks, k=rng.randint(1, 40))
+        documents.append("".join(i + rng.choice(separators) for i in parts))
+    return documents
+
+
+def _load_documents(paths):
+    chunks = []
+    for path in paths:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data:
+            chunks.extend(i.strip() for i in re.split(r"\n\n+", list(data.values())[-1]) if i.strip())
+    return chunks
+
+
+def _time_per_call(func, inputs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for i in inputs:
+            func(i)
+    return (time.perf_counter() - start) / (repeat * len(inputs)) * 1e6
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        chunks = _load_documents(sys.argv[1:])
+        timed, repeat = chunks, 1
+    else:
+        chunks = SYNTHETIC_CHUNKS + _random_chunks(20000)
+        timed, repeat = SYNTHETIC_CHUNKS, 2000
+
+    mismatches = [i for i in chunks if old_get_heuristic_score(i) != get_heuristic_score(i)]
+    if mismatches:
+        raise SystemExit(f"Scores disagree on {len(mismatches)} of {len(chunks)} chunks, e.g. {mismatches[0]!r}")
+    print(f"Scores agree on {len(chunks)} chunks")
+
+    old_us = _time_per_call(old_get_heuristic_score, timed, repeat)
+    new_us = _time_per_call(get_heuristic_score, timed, repeat)
+    print(f"get_heuristic_score  before {old_us:8.2f} us   after {new_us:8.2f} us   speedup {old_us / new_us:5.1f}x")
+
+    documents = _random_documents(chunks, 2000)
+    mismatches = [i for i in documents if old_split_references(i) != split_references(i)]
+    if mismatches:
+        raise SystemExit(f"split_references disagrees on {len(mismatches)} of {len(documents)} documents")
+    print(f"split_references agrees on {len(documents)} documents")
+
+    # A short discussion followed by a long reference list, all of which has to be scored
+    rng = random.Random(0)
+    prose = [i for i in timed if i.strip() and old_get_heuristic_score(i) < 1]
+    references = [i for i in timed if old_get_heuristic_score(i) >= 1]
+    if prose and references:
+        long_section = ["\n\n".join(rng.choices(prose, k=200) + rng.choices(references, k=3000))]
+        old_ms = _time_per_call(old_split_references, long_section, 5) / 1000
+        new_ms = _time_per_call(split_references, long_section, 5) / 1000
+        print(
+            f"split_references     before {old_ms:8.2f} ms   after {new_ms:8.2f} ms   speedup {old_ms / new_ms:5.1f}x"
+        )
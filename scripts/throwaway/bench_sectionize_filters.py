@@ -0,0 +1,166 @@
+"""Per-paragraph cost of the sectionize text filters, before and after precompiling
+their patterns and counting characters in a single pass.
+
+Usage: python bench_sectionize_filters.py [batch.jsonl.gz ...]
+
+Without arguments, a fixed set of synthetic paragraphs and headers is used. With
+titanv batch files, their "paragraph" and "sectionheader" fields are used instead.
+Each old filter is checked to agree with its replacement on every input.
+"""
+
+import gzip
+import html
+import json
+import re
+import sys
+import time
+import unicodedata
+
+from climpdfgetter.sectionize import (
+    MIN_ALPHA_CHARS,
+    MIN_CONTENT_CHARS,
+    NUMERIC_SPECIAL_THRESHOLD,
+    _content_is_substantive,
+    _header_is_noise,
+    is_string_valid,
+    unneeded_sections_no_skip_remaining,
+)
+
+# The implementations being replaced, kept verbatim for comparison.
+
+
+def old_is_string_valid(string):
+    if re.search(r"\d", string):
+        digit_count = len(re.findall(r"\d", string))
+        total_count = len(string)
+        if total_count == 0:
+            return False
+
+        numeric_percentage = (digit_count / total_count) * 100
+        if numeric_percentage > NUMERIC_SPECIAL_THRESHOLD:
+            return False
+
+        special_count = len(re.findall(r"[^a-zA-Z0-9]", string))
+        special_percentage = (special_count / total_count) * 100
+        if special_percentage > NUMERIC_SPECIAL_THRESHOLD:
+            return False
+
+    return True
+
+
+def old_normalize_text(text):
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFD", text)
+    text = html.unescape(text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def old_normalize_header(header):
+    header = old_normalize_text(header)
+    header = re.sub(r"\s*[:.\-–—]+\s*$", "", header).strip()
+    return header
+
+
+def old_header_is_noise(header):
+    if not header:
+        return True
+
+    normalized = old_normalize_header(header)
+    lowered = normalized.lower()
+    compact = re.sub(r"\s+", "", lowered)
+
+    if not normalized:
+        return True
+
+    if re.fullmatch(r"[ivxlcdm]+[.)]?", lowered):
+        return True
+    if re.fullmatch(r"[a-zA-Z][.)]?", normalized):
+        return True
+
+    if re.fullmatch(r"(table|fig|figure)\s*[-.]?\s*\d*", lowered):
+        return True
+
+    alpha_count = len(re.findall(r"[A-Za-z]", normalized))
+    if alpha_count < 2:
+        return True
+
+    if not old_is_string_valid(normalized):
+        return True
+
+    if len(normalized.split()) == 1 and len(normalized) <= 3:
+        return True
+
+    if any(j in compact for j in unneeded_sections_no_skip_remaining):
+        if len(normalized.split()) <= 3:
+            return True
+
+    return False
+
+
+def old_content_is_substantive(content):
+    content = old_normalize_text(content)
+    if len(content) < MIN_CONTENT_CHARS:
+        return False
+
+    alpha_chars = len(re.findall(r"[A-Za-z]", content))
+    if alpha_chars < MIN_ALPHA_CHARS:
+        return False
+
+    return True
+
+
+SYNTHETIC_PARAGRAPHS = [
+    "The climate of the region has been warming steadily over many decades (Smith et al., 2019; Jones 2020).",
+    "Figure 3 shows mean annual temperature trends (°C/decade) derived from CMIP6 ensemble simulations under SSP5-8.5.",
+    "| 1.2 | 3.4 | 5.6 |\n| 7.8 | 9.0 | 1.1 |\n| 2.2 | 3.3 | 4.4 |",
+    "Precipitation anomalies were computed relative to the 1981–2010 baseline using daily gridded observations. " * 8,
+    "Les précipitations ont été calculées à partir des observations quotidiennes entre 1981 et 2010.",
+    "٣٤ ５ 12 ab",
+]
+SYNTHETIC_HEADERS = ["1. Introduction", "ii.", "Table 2", "Methods:", "A)", "3.2 Study area", "Acknowledgements", "%%"]
+
+
+def _load_batches(paths):
+    paragraphs, headers = [], []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                doc = json.loads(line)
+                paragraphs.extend(doc.get("paragraph", []))
+                headers.extend(doc.get("sectionheader", []))
+    return paragraphs, headers
+
+
+def _time_per_call(func, inputs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for i in inputs:
+            func(i)
+    return (time.perf_counter() - start) / (repeat * len(inputs)) * 1e6
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        paragraphs, headers = _load_batches(sys.argv[1:])
+        repeat = 1
+    else:
+        paragraphs, headers = SYNTHETIC_PARAGRAPHS, SYNTHETIC_HEADERS
+        repeat = 5000
+
+    print(f"{len(paragraphs)} paragraphs, {len(headers)} headers, {repeat} repeats")
+
+    pairs = [
+        ("is_string_valid", old_is_string_valid, is_string_valid, paragraphs),
+        ("_content_is_substantive", old_content_is_substantive, _content_is_substantive, paragraphs),
+        ("_header_is_noise", old_header_is_noise, _header_is_noise, headers),
+    ]
+    for name, old, new, inputs in pairs:
+        mismatches = [i for i in inputs if old(i) != new(i)]
+        if mismatches:
+            raise SystemExit(f"{name} disagrees on {len(mismatches)} inputs, e.g. {mismatches[0]!r}")
+
+        old_us = _time_per_call(old, inputs, repeat)
+        new_us = _time_per_call(new, inputs, repeat)
+        print(f"{name:<25} before {old_us:8.2f} us   after {new_us:8.2f} us   speedup {old_us / new_us:5.1f}x")
@@ -0,0 +1,170 @@
+"""Run complete-semantic-scholar against a local stub of the Semantic Scholar Graph API.
+
+Usage: python check_semantic_scholar_stub.py
+
+The stub serves GET /graph/v1/paper/CorpusID:<id>, POST /graph/v1/paper/batch and the
+open-access PDFs its papers point to. Each output format is run, per ID and batched
+where supported, and the files written are checked against the stub's papers. Corpus
+ID 3 is unknown to the stub, so it must be skipped without failing the others.
+"""
+
+import json
+import re
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import climpdfgetter.crawl as crawl
+from climpdfgetter.utils import SHARD_DIR, _append_shard_index, _write_shard
+
+PDF_BYTES = b"%PDF-1.4 stub\n"
+KNOWN_IDS = (1, 2)
+REQUESTED_IDS = [1, 2, 3]
+
+
+def _paper(corpus_id, base_url):
+    return {
+        "paperId": f"p{corpus_id}",
+        "corpusId": corpus_id,
+        "title": f"Title {corpus_id}",
+        "abstract": f"Abstract {corpus_id}",
+        "authors": [{"authorId": "1", "name": "Ann Author"}, {"authorId": "2", "name": "Bo Author"}],
+        "journal": {"name": "Journal of Climate"},
+        "venue": "J. Clim.",
+        "year": 2020,
+        "externalIds": {"DOI": f"10.1000/{corpus_id}", "CorpusId": corpus_id},
+        "references": [{"paperId": "r1", "title": "Reference one"}, {"paperId": "r2", "title": None}],
+        "isOpenAccess": True,
+        "openAccessPdf": {"url": f"{base_url}/pdf/{corpus_id}.pdf", "status": "GOLD"},
+    }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _base_url(self):
+        return f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+
+    def do_GET(self):
+        pdf = re.fullmatch(r"/pdf/(\d+)\.pdf", self.path)
+        if pdf:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(PDF_BYTES)))
+            self.end_headers()
+            self.wfile.write(PDF_BYTES)
+            return
+
+        paper = re.match(r"/graph/v1/paper/CorpusID:(\d+)", self.path)
+        if paper and int(paper.group(1)) in KNOWN_IDS:
+            self._send_json(200, _paper(int(paper.group(1)), self._base_url()))
+        else:
+            self._send_json(404, {"error": "Paper not found"})
+
+    def do_POST(self):
+        if not self.path.startswith("/graph/v1/paper/batch"):
+            self._send_json(404, {"error": "Not found"})
+            return
+        ids = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["ids"]
+        papers = []
+        for paper_id in ids:
+            corpus_id = int(paper_id.split(":")[1])
+            papers.append(_paper(corpus_id, self._base_url()) if corpus_id in KNOWN_IDS else None)
+        self._send_json(200, papers)
+
+
+def _written(output_dir, pattern):
+    return {i.name: i for i in output_dir.glob(f"chunk_*/{pattern}")}
+
+
+def _check_metadata(output_dir):
+    written = _written(output_dir, "*.json")
+    assert sorted(written) == ["1.json", "2.json"], sorted(written)
+    record = json.loads(written["1.json"].read_text())
+    expected = {
+        "title": "Title 1",
+        "abstract": "Abstract 1",
+        "authors": ["Ann Author", "Bo Author"],
+        "publisher": "Journal of Climate",
+        "date": 2020,
+        "unique_id": "1",
+        "doi": "10.1000/1",
+        "references": "Reference one",
+    }
+    mismatched = {k: record[k] for k, v in expected.items() if record[k] != v}
+    assert not mismatched, mismatched
+
+
+def _check_pdf(output_dir):
+    written = _written(output_dir, "*.pdf")
+    assert sorted(written) == ["1.pdf", "2.pdf"], sorted(written)
+    assert all(i.read_bytes() == PDF_BYTES for i in written.values())
+    assert not list(output_dir.glob("chunk_*/*.part"))
+
+
+def _check_combined(output_dir):
+    written = _written(output_dir, "*.json")
+    assert sorted(written) == ["1.json", "2.json"], sorted(written)
+    record = json.loads(written["2.json"].read_text())
+    assert record["title"] == "Title 2" and record["authors"] == ["Ann Author", "Bo Author"], record
+    assert record["text"] == {"Introduction": "Text of 2."}, record
+
+
+def _run(tmp, name, input_path, args):
+    run_dir = tmp / name
+    run_dir.mkdir()
+    crawl._prep_output_dir = lambda _: (run_dir / "out").mkdir() or run_dir / "out"
+    result = CliRunner().invoke(crawl.complete_semantic_scholar, [str(input_path), *args])
+    if result.exit_code != 0:
+        raise SystemExit(f"{name} exited with {result.exit_code}: {result.output}\n{result.exception!r}")
+    return run_dir / "out"
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        ids_path = tmp / "ids.json"
+        ids_path.write_text(json.dumps(REQUESTED_IDS))
+
+        sectionized = tmp / "sectionized"
+        sectionized.mkdir()
+        for corpus_id in REQUESTED_IDS:
+            (sectionized / f"{corpus_id}_processed.json").write_text(
+                json.dumps({"Introduction": f"Text of {corpus_id}."})
+            )
+
+        # The same documents as section-dataset-v2 --output_format jsonl.gz writes them
+        sharded = tmp / "sharded"
+        records = [{"corpus_id": i, "text": {"Introduction": f"Text of {i}."}} for i in REQUESTED_IDS]
+        _write_shard(sharded / SHARD_DIR / "batch_0.jsonl.gz", records)
+        _append_shard_index(sharded, [str(i) for i in REQUESTED_IDS], "batch_0.jsonl.gz")
+
+        checks = [
+            (f"{output_format}_batch{batch_size}", ids_path, output_format, ["-b", str(batch_size)], check)
+            for output_format, check in (("metadata", _check_metadata), ("pdf", _check_pdf))
+            for batch_size in (1, 2)
+        ]
+        checks.append(("combined", sectionized, "combined", ["-i", "combined"], _check_combined))
+        checks.append(("combined_shards", sharded, "combined", ["-i", "combined"], _check_combined))
+
+        for name, input_path, output_format, args, check in checks:
+            check(_run(tmp, name, input_path, ["-o", output_format, "--api_url", api_url, *args]))
+            print(f"{name:<16} ok")
+
+    server.shutdown()
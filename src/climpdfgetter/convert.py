@@ -14,15 +14,13 @@ import openparse
 import pymupdf
 import requests
 from bs4 import BeautifulSoup
-from langdetect import DetectorFactory, LangDetectException, detect
 from PIL import Image
 from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn
 
+from .language import DEFAULT_LANGUAGE_BACKEND, LANGUAGE_BACKENDS, check_backend, is_english
 from .schema import ParsedDocumentSchema
 from .utils import _clean_subsections, _collect_from_path
 
-DetectorFactory.seed = 0
-
 BOLD_RE = re.compile(r"\*{2,3}([^*]+?)\*{2,3}")  # inside **...** or ***...***
 
 
@@ -33,20 +31,6 @@ def timeout_handler(signum, frame):
 signal.signal(signal.SIGALRM, timeout_handler)
 
 
-def is_english(text):
-    """
-    Returns True if the text is detected as English, False otherwise.
-    Handles exceptions for numeric/symbol-only strings or empty text: returns False in those cases.
-    """
-    if not text or text.strip() == "":
-        return False
-    try:
-        # detect() can throw an exception for numeric/symbol-only text
-        return detect(text) == "en"
-    except LangDetectException:
-        return False
-
-
 def convert_html(text):
     """
     Convert HTML entities back to character.
@@ -123,7 +107,7 @@ def _get_xml_from_grobid(input_path: Path, grobid_service: str = "", output_dir_
         metadata_file.rename(input_path / metadata_file.name)
 
 
-def _convert_grobid_xml_to_json(input_file) -> dict:
+def _convert_grobid_xml_to_json(input_file, language=DEFAULT_LANGUAGE_BACKEND) -> dict:
     keywords = [
         "abstract",
         "caption",
@@ -189,7 +173,7 @@ def _convert_grobid_xml_to_json(input_file) -> dict:
                     or tlower.startswith("author contributions")
                 ):
                     continue
-                if not is_english(text):
+                if not is_english(text, language):
                     continue
                 if not paras:
                     paras.append(text)
@@ -217,8 +201,11 @@ def _convert(
     images_flag: bool = False,
     output_dir: str = None,
     grobid_service: str = "http://localhost:8070/api",
+    language: str = DEFAULT_LANGUAGE_BACKEND,
 ):
 
+    check_backend(language)
+
     collected_input_files = _collect_from_path(Path(source))
 
     success_count = 0
@@ -277,7 +264,7 @@ def _convert(
             if images_flag:
                 _get_images_tables_from_layoutparser(i, output_file)
             if grobid_service:
-                raw_text = _convert_grobid_xml_to_json(i)
+                raw_text = _convert_grobid_xml_to_json(i, language)
             else:
                 raw_text = _get_text_from_openparse(i)
 
@@ -329,13 +316,25 @@ def _convert(
 @click.option("--images-tables", "-i", is_flag=True)
 @click.option("--output-dir", "-o", nargs=1)
 @click.option("--grobid_service", "-g", nargs=1)
-def convert(source: Path, images_tables: bool, output_dir: str = None, grobid_service: str = ""):
+@click.option(
+    "--language_backend",
+    type=click.Choice(LANGUAGE_BACKENDS),
+    default=DEFAULT_LANGUAGE_BACKEND,
+    help="How English paragraphs are detected. fasttext needs $CLIMPDF_FASTTEXT_MODEL.",
+)
+def convert(
+    source: Path,
+    images_tables: bool,
+    output_dir: str = None,
+    grobid_service: str = "",
+    language_backend: str = DEFAULT_LANGUAGE_BACKEND,
+):
     """
     Convert PDFs in a given directory ``source`` to json. If the input files are of a different format,
     they'll first be converted to PDF.
     """
     with Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn(), disable=True) as progress:
-        _convert(source, progress, images_tables, output_dir, grobid_service)
+        _convert(source, progress, images_tables, output_dir, grobid_service, language_backend)
 
 
 @click.command()
@@ -15,21 +15,46 @@ from semanticscholar import AsyncSemanticScholar
 
 from climpdfgetter.convert import convert, epa_ocr_to_json
 from climpdfgetter.extract_references import extract_refs
-from climpdfgetter.metadata import get_abstracts_from_solr, get_metadata_from_database
+from climpdfgetter.metadata import (
+    _MetadataIndex,
+    get_abstracts_from_solr,
+    get_metadata_from_database,
+)
 from climpdfgetter.schema import ParsedDocumentSchema
 from climpdfgetter.searches import RESILIENCE_SEARCHES
 from climpdfgetter.sectionize import section_dataset, section_dataset_v2
 from climpdfgetter.sources import source_mapping
 from climpdfgetter.titanv import get_from_titanv
 from climpdfgetter.utils import (
+    _AsyncDownloader,
+    _CheckpointLog,
     _collect_from_path,
+    _discover_shards,
     _find_project_root,
     _get_configs,
     _get_max_results,
+    _iter_shard,
+    _load_shard_index,
     _prep_output_dir,
     count_local,
 )
 
+# Semantic Scholar fields read by _write_paper, requested by both the single-paper and the
+# batch endpoints, whose own defaults differ (the batch default leaves out "references").
+DEFAULT_PAPER_FIELDS = [
+    "corpusId",
+    "title",
+    "abstract",
+    "authors",
+    "journal",
+    "venue",
+    "year",
+    "externalIds",
+    "references",
+    "isOpenAccess",
+    "openAccessPdf",
+]
+
 
 def timeout_handler(signum, frame):
     raise TimeoutError()
@@ -318,111 +343,231 @@ def _chunk_list(data, n):
     return [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]  # noqa
 
 
-async def _get_document(paper_id, semaphore, asch):
+async def _get_document(paper_id, semaphore, asch, fields=DEFAULT_PAPER_FIELDS):
     async with semaphore:
-        return await asch.get_paper("CorpusID:" + str(paper_id))
+        return await asch.get_paper("CorpusID:" + str(paper_id), fields=fields)
 
 
-async def _process_combined_chunk(
-    data_chunk, metadata_map, checkpoint_data, lock, subdir, progress, task, color, semaphore=None, asch=None
-):
-    import ast
+async def _get_documents(paper_ids, semaphore, asch, fields=DEFAULT_PAPER_FIELDS):
+    """Fetch up to 500 papers in one batch request. Returns the papers and the requested IDs that were not found."""
+    if "corpusId" not in fields:
+        fields = [*fields, "corpusId"]
+    async with semaphore:
+        papers = await asch.get_papers(["CorpusID:" + str(paper_id) for paper_id in paper_ids], fields=fields)
+    found = {str(paper["corpusId"]) for paper in papers}
+    return papers, [paper_id for paper_id in paper_ids if str(paper_id) not in found]
+
 
-    for file_path in data_chunk:
+async def _iter_queue(work_queue: asyncio.Queue):
+    """Yield items from a pre-filled queue until it is empty, letting other workers run between items."""
+    while True:
         try:
-            if file_path is None:
-                continue
+            item = work_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        yield item
+        await asyncio.sleep(0)
 
-            stem = file_path.stem
-            corpus_id = stem.replace("_processed", "")
 
-            if corpus_id in checkpoint_data:
-                progress.update(task, advance=1)
-                continue
+async def _iter_queue_batches(work_queue: asyncio.Queue, batch_size: int):
+    """Like ``_iter_queue``, but yield lists of up to ``batch_size`` items."""
+    while True:
+        batch = []
+        while len(batch) < batch_size:
+            try:
+                batch.append(work_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        if not batch:
+            return
+        yield batch
+        await asyncio.sleep(0)
+
+
+def _new_worker_stats() -> dict:
+    return {"processed": 0, "skipped": 0, "failed": 0}
+
+
+async def _process_combined_doc(
+    corpus_id, text_content, metadata_map, checkpoint_data, lock, subdir, semaphore=None, asch=None
+) -> bool:
+    """Combine one sectionized document with its metadata. Returns False if it was skipped.
+
+    ``text_content`` is the document's text dict, or the path of its ``*_processed.json``.
+    """
+    meta = None
+    paper = None
+
+    # Try to get metadata from CSV map
+    if metadata_map:
+        meta = metadata_map.get(corpus_id)
+
+    # If not found, try API if allowed
+    if not meta and asch:
+        try:
+            async with semaphore:
+                paper = await asch.get_paper("CorpusID:" + str(corpus_id))
+        except Exception:
+            # progress.log(f"[{color}]API Error for {corpus_id}: {e}")
+            pass
+
+    if not meta and not paper:
+        # progress.log(f"[{color}]ID {corpus_id} not found in metadata or API.")
+        return False
+
+    # Prepare fields
+    title = ""
+    abstract = ""
+    year = 0
+    authors_list = []
+
+    if meta:
+        title = meta["title"]
+        abstract = meta["abstract"]
+        year = meta["year"] if meta["year"] else 0
+
+        # parsed from the "authors" column when the metadata index was built
+        authors_list = meta["author_names"]
+    elif paper:
+        title = paper.title
+        abstract = paper.abstract
+        year = paper.year
+        authors_list = [author.name for author in paper.authors]
+
+    # Read text content
+    if isinstance(text_content, Path):
+        with open(text_content, "r") as f:
+            text_content = json.load(f)
+
+    final_text = text_content if isinstance(text_content, dict) else {}
+
+    schema = ParsedDocumentSchema(
+        source="Semantic Scholar",
+        title=title,
+        text=final_text,
+        abstract=abstract,
+        authors=authors_list,
+        publisher="",
+        date=year,
+        unique_id=corpus_id,
+        doi="",
+        references="",
+    )
+
+    out_path = subdir / f"{corpus_id}.json"
+    with open(out_path, "w") as f:
+        f.write(json.dumps(schema.model_dump(mode="json", by_alias=True)))
+
+    async with lock:
+        checkpoint_data.add(corpus_id)
+    return True
+
+
+def _iter_combined_docs(item):
+    """Yield ``(corpus_id, text)`` for a queued ``*_processed.json`` file or sectionized shard.
+
+    Shards are read one record at a time; file text is left as a path, read only if needed.
+    """
+    if item.name.endswith(".jsonl.gz"):
+        for record in _iter_shard(item):
+            yield str(record.get("corpus_id")), record.get("text")
+    else:
+        yield item.stem.replace("_processed", ""), item
 
-            meta = None
-            paper = None
 
-            # Try to get metadata from CSV map
-            if metadata_map and corpus_id in metadata_map:
-                meta = metadata_map[corpus_id]
+async def _process_combined_worker(
+    work_queue, metadata_map, checkpoint_data, lock, subdir, progress, task, color, semaphore=None, asch=None
+):
+    stats = _new_worker_stats()
 
-            # If not found, try API if allowed
-            if not meta and asch:
+    async for item in _iter_queue(work_queue):
+        if item is None:
+            continue
+        try:
+            for corpus_id, text_content in _iter_combined_docs(item):
                 try:
-                    async with semaphore:
-                        paper = await asch.get_paper("CorpusID:" + str(corpus_id))
-                except Exception:
-                    # progress.log(f"[{color}]API Error for {corpus_id}: {e}")
-                    pass
-
-            if not meta and not paper:
-                # progress.log(f"[{color}]ID {corpus_id} not found in metadata or API.")
+                    if corpus_id in checkpoint_data:
+                        stats["skipped"] += 1
+                    elif await _process_combined_doc(
+                        corpus_id, text_content, metadata_map, checkpoint_data, lock, subdir, semaphore, asch
+                    ):
+                        stats["processed"] += 1
+                    else:
+                        stats["skipped"] += 1
+                except Exception as e:
+                    progress.log(f"[{color}]Error processing {corpus_id}: {e}")
+                    stats["failed"] += 1
                 progress.update(task, advance=1)
-                continue
+                await asyncio.sleep(0)
+        except Exception as e:
+            # An unreadable shard; the records before the error are kept
+            progress.log(f"[{color}]Error reading {item}: {e}")
+            stats["failed"] += 1
 
-            # Prepare fields
-            title = ""
-            abstract = ""
-            year = 0
-            authors_list = []
+    return stats
 
-            if meta:
-                title = meta["title"]
-                abstract = meta["abstract"]
-                year = meta["year"] if meta["year"] else 0
 
-                try:
-                    raw_authors = meta["authors"]
-                    if raw_authors:
-                        authors_data = ast.literal_eval(raw_authors)
-                        for au in authors_data:
-                            name = f"{au.get('first', '')} {au.get('last', '')}".strip()
-                            if name:
-                                authors_list.append(name)
-                except Exception:
-                    pass
-            elif paper:
-                title = paper.title
-                abstract = paper.abstract
-                year = paper.year
-                authors_list = [author.name for author in paper.authors]
-
-            # Read text content
-            with open(file_path, "r") as f:
-                text_content = json.load(f)
-
-            final_text = text_content if isinstance(text_content, dict) else {}
-
-            schema = ParsedDocumentSchema(
-                source="Semantic Scholar",
-                title=title,
-                text=final_text,
-                abstract=abstract,
-                authors=authors_list,
-                publisher="",
-                date=year,
-                unique_id=corpus_id,
-                doi="",
-                references="",
-            )
+def _input_paper_id(doc, input_format):
+    if input_format == "csv":
+        return doc[6]
+    elif input_format == "pes2o":
+        return doc.stem
+    return doc
 
-            out_path = subdir / f"{corpus_id}.json"
-            with open(out_path, "w") as f:
-                f.write(json.dumps(schema.model_dump(mode="json", by_alias=True)))
 
-            async with lock:
-                checkpoint_data.append(corpus_id)
+def _paper_metadata(paper, abstract_as_text=False) -> ParsedDocumentSchema:
+    """Convert a Semantic Scholar paper, requested with DEFAULT_PAPER_FIELDS, to our schema.
 
-            progress.update(task, advance=1)
+    The Graph API has no "doi" or "publisher" fields; they come from "externalIds" and
+    "journal" (or "venue"). References are written as their titles, one per line.
+    """
+    data = paper.raw_data
+    abstract = data.get("abstract") or ""
+    return ParsedDocumentSchema(
+        source="Semantic Scholar",
+        title=data.get("title") or "",
+        text={"abstract": abstract} if abstract_as_text and abstract else {},
+        abstract=abstract,
+        authors=[author["name"] for author in data.get("authors") or [] if author.get("name")],
+        publisher=(data.get("journal") or {}).get("name") or data.get("venue") or "",
+        date=data.get("year") or 0,
+        unique_id=str(data["corpusId"]),
+        doi=(data.get("externalIds") or {}).get("DOI") or "",
+        references="\n".join(ref["title"] for ref in data.get("references") or [] if ref.get("title")),
+    )
 
-        except Exception as e:
-            progress.log(f"[{color}]Error processing {file_path}: {e}")
-            progress.update(task, advance=1)
+
+async def _write_paper(paper, input_format, output_format, checkpoint_data, subdir, downloader=None) -> bool:
+    """Write the requested output for one paper. Returns False if the paper was skipped.
+
+    PDFs are streamed to disk through ``downloader``, an ``_AsyncDownloader``.
+    """
+    if output_format == "pdf":
+        open_access_pdf = paper.raw_data.get("openAccessPdf") or {}
+        if not paper.raw_data.get("isOpenAccess") or open_access_pdf.get("status") != "GOLD":
+            # pdf likely undownloadable
+            return False
+
+        pdf_url = open_access_pdf["url"]
+        pdf_name = paper["corpusId"]
+        pdf_path = subdir / Path(str(pdf_name) + ".pdf")
+        if not pdf_path.exists() and pdf_name not in checkpoint_data:
+            await downloader.download(pdf_url, pdf_path)
+
+    elif output_format == "metadata":
+        # TODO: Associate metadata from SemanticScholar with input pes2o dataset
+        schema = _paper_metadata(paper, abstract_as_text=input_format == "pes2o")
+        metadata_path = subdir / Path(str(paper["corpusId"]) + ".json")
+        if not metadata_path.exists() and (input_format != "pes2o" or paper["corpusId"] not in checkpoint_data):
+            with metadata_path.open("w") as f:
+                f.write(json.dumps(schema.model_dump(mode="json", by_alias=True)))
+
+    checkpoint_data.add(paper["corpusId"])
+    return True
 
 
-async def _process_api_chunk(
-    data_chunk,
+async def _process_api_worker(
+    work_queue,
     input_format,
     output_format,
     checkpoint_data,
@@ -431,98 +576,63 @@ async def _process_api_chunk(
     progress,
     task,
     color,
+    asch=None,
+    batch_size=1,
+    fields=DEFAULT_PAPER_FIELDS,
+    downloader=None,
 ):
-    asch = AsyncSemanticScholar()
+    """
+    Look up papers for items pulled from ``work_queue`` and write their outputs.
 
-    if input_format == "csv":
-        work_tasks = [asyncio.create_task(_get_document(doc[6], semaphore, asch)) for doc in data_chunk]
-    elif input_format == "checkpoint":
-        work_tasks = [asyncio.create_task(_get_document(doc, semaphore, asch)) for doc in data_chunk]
-    elif input_format == "pes2o":
-        stems = [i.stem for i in data_chunk]
-        work_tasks = [asyncio.create_task(_get_document(stem, semaphore, asch)) for stem in stems]
+    With ``batch_size > 1``, up to ``batch_size`` (at most 500) IDs are pulled at once and
+    fetched with a single ``POST /paper/batch`` request. PDFs are downloaded through
+    ``downloader``, shared by all workers.
+    """
+    asch = asch or AsyncSemanticScholar()
+    stats = _new_worker_stats()
 
-    for paper_task in asyncio.as_completed(work_tasks):
+    async for batch in _iter_queue_batches(work_queue, batch_size):
+        paper_ids = [_input_paper_id(doc, input_format) for doc in batch]
         try:
-            paper = await paper_task
-
-            if paper is None:
-                continue
-
-            if output_format == "pdf":
-                if not paper["isOpenAccess"]:
-                    continue
-
-                if paper["openAccessPdf"]["status"] != "GOLD":  # pdf likely undownloadable
-                    continue
-
-                pdf_url = paper["openAccessPdf"]["url"]
-                pdf_name = paper["corpusId"]
-                pdf_path = subdir / Path(str(pdf_name) + ".pdf")
-                if not pdf_path.exists() and pdf_name not in checkpoint_data:
-                    r = requests.get(pdf_url, stream=True, timeout=10)
-                    r.raise_for_status()
-                    with pdf_path.open("wb") as f:
-                        f.write(r.content)
-
-            elif output_format == "metadata":
-
-                if input_format == "pes2o":
-                    # TODO: Associate metadata from SemanticScholar with input pes2o dataset
-                    schema = ParsedDocumentSchema(
-                        source="Semantic Scholar",
-                        title=paper["title"],
-                        text={"abstract": paper["abstract"]} if paper["abstract"] else {},
-                        abstract=paper["abstract"],
-                        authors=paper["authors"],
-                        publisher=paper["publisher"],
-                        date=paper["year"],
-                        unique_id=paper["corpusId"],
-                        doi=paper["doi"],
-                        references=paper["references"],
-                    )
-
-                    metadata_path = subdir / Path(str(paper["corpusId"]) + ".json")
-                    if not metadata_path.exists() and paper["corpusId"] not in checkpoint_data:
-                        with metadata_path.open("w") as f:
-                            f.write(json.dumps(schema))
-
-                else:
-                    schema = ParsedDocumentSchema(
-                        source="Semantic Scholar",
-                        title=paper.title,
-                        text={},
-                        abstract=paper.abstract,
-                        authors=paper.authors,
-                        publisher=paper.journal["name"],
-                        date=paper.year,
-                        unique_id=paper.corpusId,
-                        doi=paper["doi"],
-                        references=paper.references,
-                    )
-                    metadata_path = subdir / Path(str(paper["corpusId"]) + ".json")
-                    if not metadata_path.exists():
-                        with metadata_path.open("w") as f:
-                            f.write(json.dump(schema.model_dump(mode="json", by_alias=True)))
-
-            checkpoint_data.append(paper["corpusId"])
-
+            if batch_size > 1:
+                papers, not_found = await _get_documents(paper_ids, semaphore, asch, fields)
+            else:
+                papers, not_found = [await _get_document(paper_ids[0], semaphore, asch, fields)], []
         except KeyboardInterrupt:
             progress.log("KeyboardInterrupt")
-            if output_format == "pdf":
-                checkpoint_data.extend([doc[6] for doc in data_chunk])
-            else:
-                checkpoint_data.extend([doc for doc in data_chunk])
-            return
+            return stats
         except Exception as e:
             progress.log("Error: " + str(e))
-            progress.update(task, advance=1)
-            if output_format == "pdf":
-                checkpoint_data.extend([doc[6] for doc in data_chunk])
-            else:
-                checkpoint_data.extend([doc for doc in data_chunk])
+            stats["failed"] += len(batch)
+            progress.update(task, advance=len(batch))
+            for paper_id in paper_ids:
+                checkpoint_data.add(paper_id)
             continue
-        progress.update(task, advance=1)
+
+        for paper_id in not_found:
+            stats["failed"] += 1
+            progress.update(task, advance=1)
+            checkpoint_data.add(paper_id)
+
+        async def _handle(paper):
+            try:
+                if paper is None or not await _write_paper(
+                    paper, input_format, output_format, checkpoint_data, subdir, downloader
+                ):
+                    return "skipped"
+            except Exception as e:
+                progress.log("Error: " + str(e))
+                if paper is not None:
+                    checkpoint_data.add(paper["corpusId"])
+                return "failed"
+            return "processed"
+
+        # papers in a batch are written concurrently, so their PDF downloads overlap
+        for outcome in await asyncio.gather(*[_handle(paper) for paper in papers]):
+            stats[outcome] += 1
+            progress.update(task, advance=1)
+
+    return stats
 
 
 @click.command()
@@ -533,8 +643,46 @@ async def _process_api_chunk(
 @click.option("--input_metadata_file", "-m", nargs=1, type=click.Path(exists=True))
 @click.option("--output_format", "-o", nargs=1, type=click.Choice(["metadata", "pdf", "combined"]), default="combined")
 @click.option("-nproc", "-n", nargs=1, type=click.INT, default=1)
+@click.option(
+    "--batch_size",
+    "-b",
+    nargs=1,
+    type=click.IntRange(1, 500),
+    default=1,
+    help="Papers per Semantic Scholar request. Values above 1 use the POST /paper/batch endpoint.",
+)
+@click.option(
+    "--fields",
+    "-f",
+    nargs=1,
+    type=str,
+    default=None,
+    help="Comma-separated Semantic Scholar fields to request. Defaults to the fields written to the output.",
+)
+@click.option(
+    "--max_per_host",
+    nargs=1,
+    type=click.IntRange(min=1),
+    default=4,
+    help="Maximum concurrent PDF downloads from any single host.",
+)
+@click.option(
+    "--api_url",
+    nargs=1,
+    type=str,
+    default=None,
+    help="Alternative Semantic Scholar API base URL, e.g. a local stub server.",
+)
 def complete_semantic_scholar(
-    input_file: Path, input_format: str, input_metadata_file: Path, output_format: str, nproc: int
+    input_file: Path,
+    input_format: str,
+    input_metadata_file: Path,
+    output_format: str,
+    nproc: int,
+    batch_size: int,
+    fields: str | None,
+    max_per_host: int,
+    api_url: str | None,
 ):
     """
     Given an input file or directory, containing either:
@@ -547,39 +695,46 @@ def complete_semantic_scholar(
         2. Metadata from Semantic Scholar
 
     and match them with the input data.
+
+    With `--batch_size` above 1, metadata and PDF lookups fetch up to 500 papers per request.
     """
+    if fields:
+        fields = [i.strip() for i in fields.split(",") if i.strip()]
+    else:
+        fields = DEFAULT_PAPER_FIELDS
 
     async def _complete_semantic_scholar(
-        chunk_idx,
-        data_chunk,
+        worker_idx,
+        work_queue,
         output_dir,
         progress,
+        task,
         checkpoint_data,
         lock,
         semaphore,
         output_format,
         metadata_map=None,
+        downloader=None,
     ):
 
-        subdir = output_dir / Path("chunk_" + str(chunk_idx))
+        subdir = output_dir / Path("chunk_" + str(worker_idx))
         subdir.mkdir(exist_ok=True)
 
-        color = ["red", "green", "blue", "yellow", "magenta", "cyan"][chunk_idx % 6]
-        task = progress.add_task(f"[{color}]Chunk " + str(chunk_idx) + ": ", total=len(data_chunk))
+        color = ["red", "green", "blue", "yellow", "magenta", "cyan"][worker_idx % 6]
 
         if output_format == "combined":
-            asch = AsyncSemanticScholar() if input_format == "combined" else None
+            asch = AsyncSemanticScholar(api_url=api_url) if input_format == "combined" else None
 
             if not metadata_map and input_format != "combined":
                 progress.log(f"[{color}]Error: Metadata map is empty and fallback logic disabled.")
-                return
+                return _new_worker_stats()
 
-            await _process_combined_chunk(
-                data_chunk, metadata_map, checkpoint_data, lock, subdir, progress, task, color, semaphore, asch
+            return await _process_combined_worker(
+                work_queue, metadata_map, checkpoint_data, lock, subdir, progress, task, color, semaphore, asch
             )
         else:
-            await _process_api_chunk(
-                data_chunk,
+            return await _process_api_worker(
+                work_queue,
                 input_format,
                 output_format,
                 checkpoint_data,
@@ -588,36 +743,33 @@ def complete_semantic_scholar(
                 progress,
                 task,
                 color,
+                AsyncSemanticScholar(api_url=api_url),
+                batch_size,
+                fields,
+                downloader,
             )
 
     async def main_multiple_ss(input_file, input_format, input_metadata_file, output_format, nproc):
 
         path = _prep_output_dir("SEMANTIC_SCHOLAR_complete")
-        checkpoint = path.parent / Path("SS_checkpoint.json")
-        if not checkpoint.exists():
-            checkpoint.touch()
-            checkpoint_data = []
-        else:
-            try:
-                checkpoint_data = checkpoint.read_text()
-                checkpoint_data = json.loads(checkpoint_data)
-            except json.decoder.JSONDecodeError:
-                checkpoint_data = []
-        click.echo(f"Loaded {len(checkpoint_data)} processed IDs from checkpoint.")
 
         checkpoint_lock = asyncio.Lock()
         semaphore = asyncio.Semaphore(nproc)
 
-        # split data into 2 equal chunks
+        # all workers pull from one shared queue, so the run ends when the queue drains
 
+        shards = []
         if input_format == "pes2o" or input_format == "combined":
-            data = _collect_from_path(Path(input_file))
-            # Ignore rejected files
-            data = [f for f in data if not f.name.endswith("_rejected.json")]
-            click.echo(f"Found {len(data)} input files.")
-
-            chunk_size = len(data) // nproc
-            chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]  # noqa
+            shards = _discover_shards(Path(input_file)) if input_format == "combined" else []
+            if shards:
+                # Workers take a whole shard at a time and stream its records
+                data = shards
+                click.echo(f"Found {len(data)} sectionized shards.")
+            else:
+                data = _collect_from_path(Path(input_file))
+                # Ignore rejected files
+                data = [f for f in data if f is not None and not f.name.endswith("_rejected.json")]
+                click.echo(f"Found {len(data)} input files.")
 
         if input_format == "csv" or input_format == "checkpoint":
             with open(input_file, "r") as f:
@@ -625,55 +777,75 @@ def complete_semantic_scholar(
                     reader = csv.reader(f)
                     # data = list(reader)
                     data = list(reader)[1:]  # first line is header
-                    chunk_size = len(data) // nproc
-                    chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]  # noqa
                 elif input_format == "checkpoint":
                     try:
-                        with open(input_file, "r") as f:
-                            checkpoint_data = json.load(f)
+                        data = json.load(f)
                     except json.decoder.JSONDecodeError:
-                        checkpoint_data = []
-                    chunk_size = len(checkpoint_data) // nproc
-                    chunks = [
-                        checkpoint_data[i : i + chunk_size] for i in range(0, len(checkpoint_data), chunk_size)  # noqa
-                    ]
+                        data = []
+
+        # The progress total counts documents, which for shards come from the shard index
+        n_docs = (len(_load_shard_index(Path(input_file))) or None) if shards else len(data)
+
+        work_queue = asyncio.Queue()
+        for item in data:
+            work_queue.put_nowait(item)
 
         metadata_map = {}
         if output_format == "combined":
             if input_metadata_file:  # Only load if provided
-                click.echo("Loading metadata map...")
-                with open(input_metadata_file, "r") as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        # Assuming paper_id is the key
-                        metadata_map[row["paper_id"]] = row
-                click.echo(f"Loaded {len(metadata_map)} metadata entries.")
+                # Assuming paper_id is the key. The CSV is indexed once, then rows are looked up lazily.
+                click.echo("Loading metadata index...")
+                metadata_map = _MetadataIndex(Path(input_metadata_file))
+                click.echo(f"Indexed {len(metadata_map)} metadata entries.")
             elif input_format != "combined":
                 click.echo(
                     "Error: --input_metadata_file / -m required for combined output unless input_format is 'combined'."
                 )
                 return
 
-        with Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn(), disable=True) as progress:
-            await asyncio.gather(
-                *[
-                    _complete_semantic_scholar(
-                        i,
-                        chunk,
-                        path,
-                        progress,
-                        checkpoint_data,
-                        checkpoint_lock,
-                        semaphore,
-                        output_format,
-                        metadata_map,
-                    )
-                    for i, chunk in enumerate(chunks)
-                ]
-            )
+        # Completed IDs are appended to a log as they finish and held in a set for O(1) membership checks.
+        checkpoint_data = _CheckpointLog(
+            path.parent / Path("SS_checkpoint.log"), legacy_json=path.parent / Path("SS_checkpoint.json")
+        )
+        click.echo(f"Loaded {len(checkpoint_data)} processed IDs from checkpoint.")
+
+        downloader = _AsyncDownloader(per_host=max_per_host) if output_format == "pdf" else None
 
-        with open(checkpoint, "w") as f:
-            f.write(json.dumps(checkpoint_data))
+        # The downloader's client is closed even if a worker fails
+        try:
+            with (
+                checkpoint_data,
+                Progress(
+                    SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn(), disable=True
+                ) as progress,
+            ):
+                task = progress.add_task("[white]Documents: ", total=n_docs)
+                worker_stats = await asyncio.gather(
+                    *[
+                        _complete_semantic_scholar(
+                            i,
+                            work_queue,
+                            path,
+                            progress,
+                            task,
+                            checkpoint_data,
+                            checkpoint_lock,
+                            semaphore,
+                            output_format,
+                            metadata_map,
+                            downloader,
+                        )
+                        for i in range(nproc)
+                    ]
+                )
+        finally:
+            if downloader is not None:
+                await downloader.aclose()
+
+        for i, stats in enumerate(worker_stats):
+            click.echo(
+                f"Worker {i}: {stats['processed']} processed, {stats['skipped']} skipped, {stats['failed']} failed."
+            )
 
     asyncio.run(main_multiple_ss(input_file, input_format, input_metadata_file, output_format, nproc))
 
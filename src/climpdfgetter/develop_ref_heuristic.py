@@ -1,282 +1,234 @@
+"""Tune the reference heuristic of ref_extraction_utils against labeled chunks.
+
+1. ``sample`` writes the paragraphs of the last section of some sectionized documents as
+   JSONL fixtures, ``{"text": ..., "label": 0 or 1, "source": ...}``, labeled by the current
+   heuristic. Correct the labels by hand; 1 means the paragraph is a reference.
+2. ``features`` extracts HEURISTIC_FEATURES from the fixtures once, into a NumPy ``.npz``.
+3. ``fit`` fits logistic-regression weights and a threshold over the cached features and
+   exports a weights file, which ``climpdf extract-refs --weights`` loads at runtime.
+4. ``evaluate`` scores the cached features with the default or an exported weights file.
+
+For instance::
+
+    python develop_ref_heuristic.py sample data/OSTI_sectionized fixtures.jsonl
+    python develop_ref_heuristic.py features fixtures.jsonl features.npz
+    python develop_ref_heuristic.py fit features.npz ref_weights.json
+"""
+
 import json
 import random
 import re
 from pathlib import Path
 
-
-def get_heuristic_score(text, debug=False):
-    score = 0
-    text_lower = text.lower()
-
-    # --- Strong Positive Signals ---
-    # DOI
-    if re.search(r"10\.\d{4,}/", text):
-        if debug:
-            print("  +5 DOI")
-        score += 5
-    # URL / Retrieval
-    if (
-        "http://" in text
-        or "https://" in text
-        or "retrieved from" in text_lower
-        or "accessed:" in text_lower
-        or "accessed," in text_lower
-        or "available at:" in text_lower
-    ):
-        if debug:
-            print("  +4 URL")
-        score += 4
-    # Citation Markers at start
-    if re.match(r"^\[\d+\]", text.strip()) or re.match(r"^\d+\.", text.strip()):
-        if debug:
-            print("  +5 Citation Marker")
-        score += 5
-    # "et al."
-    if "et al." in text_lower or "et al," in text_lower:
-        if debug:
-            print("  +4 et al.")
-        score += 4
-    # Common reference terms / Journal Abbreviations
-    journal_terms = [
-        "proc.",
-        "journal of",
-        "trans.",
-        "intl.",
-        "conf.",
-        "univ.",
-        "press",
-        "adv.",
-        "sci.",
-        "lett.",
-        "rev.",
-        "res.",
-        "phys.",
-        "chem.",
-        "biol.",
-        "geophys.",
-        "ann.",
-        "bull.",
-        "j.",
-        "am.",
-        "soc.",
-        "ieee",
-        "acm",
-        "nature",
-        "science",
-        "cell",
-        "literature cited",
-        "ph.d. thesis",
-        "doctoral thesis",
-        "springer",
-    ]
-    # Check for whole words to avoid "res" matching "results"
-    # We'll use a regex for these
-    found_terms = []
-    for term in journal_terms:
-        # escapes dots for regex
-        term_esc = re.escape(term)
-        if re.search(r"\b" + term_esc + r"\b", text_lower) or (term.endswith(".") and term in text_lower):
-            found_terms.append(term)
-
-    if found_terms:
-        if debug:
-            print(f"  +3 Journal Terms: {found_terms}")  # noqa
-        score += 3
-
-    # --- Medium Positive Signals ---
-    # Year (1900-2029) - excluding years commonly found in prose like "In 1999, we..."
-    # References usually have (Year) or Year after authors.
-    year_match = re.search(r"\b(19|20)\d{2}\b", text)
-    if year_match:
-        # Check if it looks like a citation year (in parens or at end/start)
-        if (
-            re.search(r"\((19|20)\d{2}\)", text)
-            or re.match(r"^(19|20)\d{2}\b", text.strip())
-            or re.search(r"\b(19|20)\d{2}\.$", text.strip())
-        ):
-            if debug:
-                print(f"  +3 Strong Year: {year_match.group(0)}")  # noqa
-            score += 2
-        else:
-            if debug:
-                print(f"  +1 Weak Year: {year_match.group(0)}")  # noqa
-            score += 1
-
-    # Pages / Vol
-    if re.search(r"\b(vol\.|no\.|pp\.)", text_lower) or re.search(r"\d+\s*:\s*\d+[-–]\d+", text):
-        if debug:
-            print("  +2 Pages/Vol")  # noqa
-        score += 2
-
-    # Author-like patterns
-    # "Smith, J." or "Smith, J.A."
-    if re.match(r"^[A-Z][a-z]+,\s+[A-Z]\.", text.strip()):
-        if debug:
-            print("  +2 Author (Last, I.)")  # noqa
-        score += 2
-    # "J. Smith" or "J.A. Smith" - riskier, distinct from "U.S. Army"
-    if re.match(r"^[A-Z]\.([A-Z]\.)?\s+[A-Z][a-z]+", text.strip()) and not re.match(r"^U\.S\.", text.strip()):
-        if debug:
-            print("  +1 Author (I. Last)")  # noqa
-        score += 1
-
-    # --- Content Signals (Negative) ---
-    # Common Sentence Starters / Connectives
-    prose_markers = [
-        "however",
-        "therefore",
-        "although",
-        "furthermore",
-        "in conclusion",
-        "we found",
-        "results show",
-        "discussion",
-        "abstract",
-        "introduction",
-        "as shown in",
-        "the figure",
-        "the table",
-    ]
-    if any(marker in text_lower for marker in prose_markers):
-        if debug:
-            print("  -5 Prose Marker")  # noqa
-        score -= 5
-
-    # First person
-    if re.search(r"\bwe\b", text_lower) or re.search(r"\bour\b", text_lower):
-        if debug:
-            print("  -3 First Person")  # noqa
-        score -= 3
-
-    # Figure/Table captions
-    if re.match(r"^(figure|fig\.|table|tab\.)\s*\d+", text_lower.strip()):
-        if debug:
-            print("  -10 Figure/Table Caption")  # noqa
-        score -= 10
-
-    # Single sentence ending in period without citation features
-    if len(text.split()) > 10 and text.strip().endswith(".") and score < 2:
-        # Long prose-like line that didn't trigger positive signals
-        if debug:
-            print("  -2 Plain Sentence")  # noqa
-        score -= 2
-
-    #  Relatively large percentage of single-character tokens resembles lists of authors
-    percentage_single_char = len([i for i in text.split(" ") if len(i) == 1]) / len(text.split(" "))
-    percentage_single_char_with_period = len([i for i in text.split(" ") if len(i) == 2 and i.endswith(".")]) / len(
-        text.split(" ")
+import click
+import numpy as np
+
+try:
+    from .ref_extraction_utils import (
+        DEFAULT_REFERENCE_HEURISTIC,
+        GATEABLE_FEATURES,
+        HEURISTIC_FEATURES,
+        _heuristic_features,
+        _ReferenceHeuristic,
+        split_references,
     )
-    if percentage_single_char + percentage_single_char_with_period > 0.10:
-        if debug:
-            print("  +3 Single Character Tokens")  # noqa
-        score += 3
-
-    print(text + "\n")
-    print(f"Score: {score}\n")
-    if score <= 2:
-        import ipdb
-
-        ipdb.set_trace()
-
+    from .utils import _discover_shards, _iter_shard
+except ImportError:
+    from ref_extraction_utils import (
+        DEFAULT_REFERENCE_HEURISTIC,
+        GATEABLE_FEATURES,
+        HEURISTIC_FEATURES,
+        _heuristic_features,
+        _ReferenceHeuristic,
+        split_references,
+    )
+    from utils import _discover_shards, _iter_shard
+
+
+def _last_section(data):
+    """Return the text of the last section of a sectionized document, with any extracted
+    "References" merged back in.
+    """
+    keys = [i for i in data if i != "References"]
+    if not keys:
+        return data.get("References", "")
+    text = data[keys[-1]]
+    if "References" in data:
+        text = text + "\n\n" + data["References"]
+    return text
+
+
+def _iter_documents(directory):
+    """Yield ``(name, sectionized text dict)`` for the shards or JSON files in ``directory``."""
+    shards = _discover_shards(directory)
+    if shards:
+        for shard in shards:
+            for record in _iter_shard(shard):
+                if record.get("text"):
+                    yield str(record.get("corpus_id")), record["text"]
+    else:
+        for path in sorted(directory.glob("*_processed.json")):
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data:
+                yield path.name, data
+
+
+def _load_fixtures(paths):
+    texts, labels = [], []
+    for path in paths:
+        with open(path, "r") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                fixture = json.loads(line)
+                if fixture.get("label") not in (0, 1, False, True):
+                    raise click.ClickException(f"{path}:{line_number} needs a label of 0 or 1")
+                texts.append(fixture["text"])
+                labels.append(int(fixture["label"]))
+    return texts, labels
+
+
+def _load_features(path):
+    with np.load(path) as cache:
+        if tuple(cache["features"]) != HEURISTIC_FEATURES:
+            raise click.ClickException(f"{path} was extracted for different features; run `features` again")
+        return cache["X"], cache["y"]
+
+
+def _score_matrix(X, heuristic):
+    """Score every row of a feature matrix like ``heuristic.score`` does for one vector."""
+    weights = np.asarray(heuristic.weight_vector, dtype=float)
+    head = len(HEURISTIC_FEATURES) - len(GATEABLE_FEATURES)
+
+    score = X[:, :head] @ weights[:head]
+    for i, feature in enumerate(GATEABLE_FEATURES, start=head):
+        counts = X[:, i].astype(bool)
+        gate = heuristic.gates.get(feature)
+        if gate is not None:
+            counts &= score < gate
+        score = score + weights[i] * counts
     return score
 
 
-def extract_references(file_path):
-    with open(file_path, "r") as f:
-        data = json.load(f)
-
-    if not data:
-        return None, None
-
-    # Get the last key's value
-    last_key = list(data.keys())[-1]
-    last_value = data[last_key]
-
-    # Split by double newline (paragraphs)
-    chunks = re.split(r"\n\n+", last_value)
-
-    # Threshold for deciding "Is this a reference?"
-    # Since visual inspection showed some refs scoring 0 or 2, and captions scoring 2
-    # We really want to avoid captions.
-    threshold = 2
-
-    # Backward pass
-    # We look for a *contiguous* block of references at the end.
-    # The first text chunk (from the end) that fails the check terminates the reference section.
-
-    split_index = len(chunks)
+def _fit_logistic(X, y, l2=1.0, iterations=100, tol=1e-10):
+    """Fit L2-regularized logistic regression by Newton's method. Returns ``(weights, bias)``."""
+    A = np.hstack([X.astype(float), np.ones((len(X), 1))])
+    # The bias is not regularized
+    penalty = np.diag([l2] * X.shape[1] + [0.0])
+    beta = np.zeros(A.shape[1])
+
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(A @ beta)))
+        gradient = A.T @ (p - y) + penalty @ beta
+        hessian = (A.T * (p * (1.0 - p))) @ A + penalty
+        step = np.linalg.lstsq(hessian, gradient, rcond=None)[0]
+        beta -= step
+        if np.abs(step).max() < tol:
+            break
 
-    for i in range(len(chunks) - 1, -1, -1):
-        chunk = chunks[i].strip()
-        if not chunk:
-            continue
+    return beta[:-1], beta[-1]
 
-        score = get_heuristic_score(chunk)
 
-        # If score is high enough, we assume it's a reference and update split_index.
-        # If score is low, we assume we hit content and STOP.
-        if score >= threshold:
-            split_index = i
-        else:
-            break
+def _report(name, X, y, heuristic):
+    predicted = _score_matrix(X, heuristic) >= heuristic.threshold
+    actual = y.astype(bool)
+    true_positives = int((predicted & actual).sum())
+    precision = true_positives / max(int(predicted.sum()), 1)
+    recall = true_positives / max(int(actual.sum()), 1)
+    accuracy = float((predicted == actual).mean()) if len(y) else 0.0
+    print(f"{name:<10} accuracy {accuracy:.4f}   precision {precision:.4f}   recall {recall:.4f}")
 
-    content_chunks = chunks[:split_index]
-    ref_chunks = chunks[split_index:]
 
-    return content_chunks, ref_chunks
+@click.group()
+def main():
+    """Tune the weights of the reference heuristic against labeled paragraphs."""
+
+
+@main.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False, dir_okay=True))
+@click.argument("output", type=click.Path())
+@click.option("--n_docs", default=50, help="Number of documents to sample.")
+@click.option("--seed", default=0, help="Seed for choosing documents.")
+def sample(directory, output, n_docs, seed):
+    """Write the last-section paragraphs of N_DOCS sectionized documents in DIRECTORY as fixtures."""
+    documents = list(_iter_documents(Path(directory)))
+    documents = random.Random(seed).sample(documents, min(n_docs, len(documents)))
+
+    n_fixtures = 0
+    with open(output, "w") as f:
+        for name, data in documents:
+            text = _last_section(data)
+            _, refs = split_references(text)
+            n_refs = len(re.split(r"\n\n+", refs)) if refs else 0
+            chunks = re.split(r"\n\n+", text)
+            for i, chunk in enumerate(chunks):
+                if not chunk.strip():
+                    continue
+                label = int(i >= len(chunks) - n_refs)
+                f.write(json.dumps({"text": chunk.strip(), "label": label, "source": name}) + "\n")
+                n_fixtures += 1
+
+    print(f"Wrote {n_fixtures} paragraphs from {len(documents)} documents to {output}")
+
+
+@main.command()
+@click.argument("fixtures", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", type=click.Path())
+def features(fixtures, output):
+    """Extract HEURISTIC_FEATURES from labeled FIXTURES (JSONL) into an OUTPUT .npz cache."""
+    texts, labels = _load_fixtures(fixtures)
+    X = np.array([_heuristic_features(i) for i in texts], dtype=np.uint8).reshape(len(texts), len(HEURISTIC_FEATURES))
+    np.savez_compressed(output, X=X, y=np.array(labels, dtype=np.uint8), features=np.array(HEURISTIC_FEATURES))
+    print(f"Extracted {X.shape[1]} features from {len(texts)} paragraphs ({int(sum(labels))} references) to {output}")
+
+
+@main.command()
+@click.argument("feature_cache", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", type=click.Path())
+@click.option("--l2", default=1.0, help="L2 regularization strength.")
+def fit(feature_cache, output, l2):
+    """Fit weights and a threshold over a FEATURE_CACHE from `features`, and export them to OUTPUT.
+
+    The fitted weights are ungated: a paragraph is a reference if its weights sum to at
+    least the threshold, i.e. if the fitted probability is at least one half.
+    """
+    X, y = _load_features(feature_cache)
+    if len(set(y.tolist())) < 2:
+        raise click.ClickException("Fixtures need both references and non-references")
+
+    weights, bias = _fit_logistic(X, y, l2)
+    heuristic = _ReferenceHeuristic(
+        {feature: round(float(w), 4) for feature, w in zip(HEURISTIC_FEATURES, weights)},
+        gates={},
+        threshold=round(float(-bias), 4),
+    )
+    heuristic.to_file(output)
 
+    _report("default", X, y, DEFAULT_REFERENCE_HEURISTIC)
+    _report("fitted", X, y, heuristic)
+    print(f"Wrote weights to {output}")
 
-def test_single_file(path_str):
-    p = Path(path_str)
-    print(f"--- DEBUG File: {p.name} ---")
-    content, refs = extract_references(p)
 
-    if refs:
-        print(f"First Ref Chunk (Score: {get_heuristic_score(refs[0], debug=True)}):")  # noqa
-        print(f"'{refs[0][:200]}'")  # noqa
+@main.command()
+@click.argument("feature_cache", type=click.Path(exists=True, dir_okay=False))
+@click.option("--weights", type=click.Path(exists=True, dir_okay=False), help="Weights file from `fit`.")
+def evaluate(feature_cache, weights):
+    """Report how well the default heuristic, or WEIGHTS, labels a FEATURE_CACHE."""
+    X, y = _load_features(feature_cache)
+    if weights:
+        _report("weights", X, y, _ReferenceHeuristic.from_file(weights))
     else:
-        print("No references found.")
-
-    if content:
-        last_chunk = content[-1]
-        print(f"\nLast Content Chunk (Score: {get_heuristic_score(last_chunk, debug=True)}):")  # noqa
-        print(f"'{last_chunk[-200:] if len(last_chunk) > 200 else last_chunk}'")  # noqa
+        _report("default", X, y, DEFAULT_REFERENCE_HEURISTIC)
 
 
-def main():
-    # Specific file that failed previously
-    problem_files = [
-        "53637945_processed.json",  # Caption marked as ref
-        "39872203_processed.json",  # Refs missed (Score 0)
-        "92168237_processed.json",  # Refs missed
-    ]
-
-    base_dir = Path("/Users/jnavarro/callm/climpdfgetter/data/600k_titanv_results_12-1_sectionized_no_rejected")
-
-    print("=== TESTING PROBLEM FILES ===")
-    for fname in problem_files:
-        path = base_dir / fname
-        if path.exists():
-            test_single_file(path)
-            print("\n" + "=" * 30 + "\n")
-
-    print("=== RANDOM SAMPLE ===")
-    all_files = list(base_dir.glob("*_processed.json"))
-    sample_files = random.sample(all_files, 50)
-
-    for p in sample_files:
-        print(f"--- File: {p.name} ---")
-        content, refs = extract_references(p)
-        print(f"  Detected {len(refs)} reference blocks.")
-        if refs:
-            print(f"  [REF START] score={get_heuristic_score(refs[0])}: {refs}...")
-        if content:
-            print(f"  [CONTENT END] score={get_heuristic_score(content[-1])}: ...{content[-1][-1000:]}")
-        print("\n")
+@main.command()
+@click.argument("output", type=click.Path())
+def export_defaults(output):
+    """Write the default weights, gates and threshold to OUTPUT, as a starting weights file."""
+    DEFAULT_REFERENCE_HEURISTIC.to_file(output)
+    print(f"Wrote default weights to {output}")
 
 
 if __name__ == "__main__":
     main()
-
-
-text = ""
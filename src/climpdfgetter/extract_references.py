@@ -6,12 +6,76 @@ from joblib import Parallel, delayed
 from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn
 
 try:
-    from .ref_extraction_utils import split_references
+    from .ref_extraction_utils import DEFAULT_REFERENCE_HEURISTIC, _ReferenceHeuristic, split_references
+    from .utils import _discover_shards, _iter_shard, _load_shard_index, _write_json, _write_shard
 except ImportError:
-    from ref_extraction_utils import split_references
+    from ref_extraction_utils import DEFAULT_REFERENCE_HEURISTIC, _ReferenceHeuristic, split_references
+    from utils import _discover_shards, _iter_shard, _load_shard_index, _write_json, _write_shard
+
+
+def _resplit_references(data, heuristic=DEFAULT_REFERENCE_HEURISTIC):
+    """Re-split references out of the last section of a sectionized document, in place.
+
+    Any existing "References" entry is merged back first, so documents processed by an older
+    heuristic are re-split with ``heuristic``. Returns a status message.
+    """
+    # Get the last key
+    keys = list(data.keys())
+    last_key = keys[-1]
+
+    # If "References" key exists, we want to re-process (merge and re-split)
+    # to take advantage of the improved heuristic.
+    # But we must be careful: if "References" IS the last key, we need to handle that.
+    # Usually checking "References" in data is enough.
+
+    full_text = data[last_key]
+
+    if "References" in data:
+        # Reconstruct original text
+        # Assuming References was stripped from the end of the last key.
+        # However, if 'References' IS the last key (alphabetically or insertion order), we need to be careful.
+        # But keys[-1] from data.keys() depends on insertion order in Python 3.7+
+        # If References was added last, it is the last key.
+
+        # Let's verify if References is indeed separate from last content key.
+        if last_key == "References":
+            # This could happen if References is the very last thing added.
+            # We need to find the "Content" key preceding it.
+            # But to be safe, let's look for known content key or just take the one before.
+            if len(keys) >= 2:
+                content_key = keys[-2]
+                full_text = data[content_key] + "\n\n" + data["References"]
+                last_key = content_key  # We will update this content key
+            else:
+                # Should not verify happen if we have headers
+                full_text = data["References"]
+                last_key = "References"  # Weird case
+        else:
+            # References exists but is not the last key?
+            # Or maybe it is the last key but we just grabbed keys[-1].
+            # Let's be explicit.
+            full_text = data[last_key] + "\n\n" + data["References"]
+
+    content, refs = split_references(full_text, heuristic=heuristic)
+
+    if refs:
+        # Update the last key with stripped content
+        data[last_key] = content
+        # Add/Update References key
+        data["References"] = refs
+        return "References extracted (updated)"
 
+    # If we previously had references but now find none (unlikely with looser heuristic but possible)
+    # We should probably remove the References key and restore content.
+    if "References" in data:
+        data[last_key] = full_text
+        del data["References"]
+        return "References removed (re-merged)"
 
-def process_file(file_path):
+    return "No references found"
+
+
+def process_file(file_path, pretty=False, heuristic=DEFAULT_REFERENCE_HEURISTIC):
     try:
         with open(file_path, "r") as f:
             data = json.load(f)
@@ -19,92 +83,87 @@ def process_file(file_path):
         if not data:
             return False, file_path.name, "Empty file"
 
-        # Get the last key
-        keys = list(data.keys())
-        if not keys:
-            return False, file_path.name, "No keys"
-
-        last_key = keys[-1]
-
-        # If "References" key exists, we want to re-process (merge and re-split)
-        # to take advantage of the improved heuristic.
-        # But we must be careful: if "References" IS the last key, we need to handle that.
-        # Usually checking "References" in data is enough.
-
-        full_text = data[last_key]
-
-        if "References" in data:
-            # Reconstruct original text
-            # Assuming References was stripped from the end of the last key.
-            # However, if 'References' IS the last key (alphabetically or insertion order), we need to be careful.
-            # But keys[-1] from data.keys() depends on insertion order in Python 3.7+
-            # If References was added last, it is the last key.
-
-            # Let's verify if References is indeed separate from last content key.
-            if last_key == "References":
-                # This could happen if References is the very last thing added.
-                # We need to find the "Content" key preceding it.
-                # But to be safe, let's look for known content key or just take the one before.
-                if len(keys) >= 2:
-                    content_key = keys[-2]
-                    full_text = data[content_key] + "\n\n" + data["References"]
-                    last_key = content_key  # We will update this content key
-                else:
-                    # Should not verify happen if we have headers
-                    full_text = data["References"]
-                    last_key = "References"  # Weird case
-            else:
-                # References exists but is not the last key?
-                # Or maybe it is the last key but we just grabbed keys[-1].
-                # Let's be explicit.
-                full_text = data[last_key] + "\n\n" + data["References"]
-
-        content, refs = split_references(full_text)
+        msg = _resplit_references(data, heuristic)
+        if msg != "No references found":
+            _write_json(file_path, data, pretty)
 
-        if refs:
-            # Update the last key with stripped content
-            data[last_key] = content
-            # Add/Update References key
-            data["References"] = refs
+        return True, file_path.name, msg
 
-            with open(file_path, "w") as f:
-                json.dump(data, f, indent=4)
+    except Exception as e:
+        return False, file_path.name, str(e)
 
-            return True, file_path.name, "References extracted (updated)"
-        else:
-            # If we previously had references but now find none (unlikely with looser heuristic but possible)
-            # We should probably remove the References key and restore content.
-            if "References" in data:
-                data[last_key] = full_text
-                del data["References"]
-                with open(file_path, "w") as f:
-                    json.dump(data, f, indent=4)
-                return True, file_path.name, "References removed (re-merged)"
 
-            return True, file_path.name, "No references found"
+def process_shard(shard_path, heuristic=DEFAULT_REFERENCE_HEURISTIC):
+    """Re-split references for every record of a sectionized shard, rewriting it if anything changed."""
+    results = []
+    records = []
+    changed = False
+    try:
+        for record in _iter_shard(shard_path):
+            records.append(record)
+            if not record.get("text"):
+                results.append((False, record.get("corpus_id"), "Empty document"))
+                continue
+            try:
+                msg = _resplit_references(record["text"], heuristic)
+            except Exception as e:
+                results.append((False, record.get("corpus_id"), str(e)))
+                continue
+            changed = changed or msg != "No references found"
+            results.append((True, record.get("corpus_id"), msg))
+
+        if changed:
+            _write_shard(shard_path, records)
 
     except Exception as e:
-        return False, file_path.name, str(e)
+        results.append((False, shard_path.name, str(e)))
+
+    return results
 
 
 @click.command()
 @click.argument("directory", type=click.Path(exists=True, file_okay=False, dir_okay=True))
-def extract_refs(directory):
-    """Extract references from JSON files in DIRECTORY."""
+@click.option("--pretty", is_flag=True, default=False, help="Indent rewritten JSON files, for debugging.")
+@click.option(
+    "--weights",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Weights file exported by develop_ref_heuristic.py, instead of the default heuristic.",
+)
+def extract_refs(directory, pretty=False, weights=None):
+    """Extract references from JSON files in DIRECTORY.
+
+    If DIRECTORY holds sectionized shards (shards/*.jsonl.gz), those are processed instead.
+    """
+    heuristic = _ReferenceHeuristic.from_file(weights) if weights else DEFAULT_REFERENCE_HEURISTIC
 
     data_dir = Path(directory)
-    files = list(data_dir.glob("*_processed.json"))
-
-    print(f"Found {len(files)} files in {directory}")
+    shards = _discover_shards(data_dir)
+    if shards:
+        files = shards
+        total = len(_load_shard_index(data_dir)) or len(shards)
+        print(f"Found {len(shards)} shards in {directory}")
+    else:
+        files = list(data_dir.glob("*_processed.json"))
+        total = len(files)
+        print(f"Found {len(files)} files in {directory}")
 
     success_count = 0
     extracted_count = 0
     fail_count = 0
 
     with Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn()) as progress:
-        task = progress.add_task("[green]Processing", total=len(files))
+        task = progress.add_task("[green]Processing", total=total)
 
-        results = Parallel(n_jobs=-1, return_as="generator")(delayed(process_file)(p) for p in files)
+        if shards:
+            shard_results = Parallel(n_jobs=-1, return_as="generator")(
+                delayed(process_shard)(p, heuristic) for p in files
+            )
+            results = (result for shard_result in shard_results for result in shard_result)
+        else:
+            results = Parallel(n_jobs=-1, return_as="generator")(
+                delayed(process_file)(p, pretty, heuristic) for p in files
+            )
 
         for success, name, msg in results:
             progress.update(task, advance=1)
@@ -0,0 +1,132 @@
+import os
+import re
+
+from langdetect import DetectorFactory, LangDetectException, detect
+
+DetectorFactory.seed = 0
+
+# "langdetect" is the original backend, and the default,
+# "stopwords" compares English and foreign function-word counts, with no model to load,
+# "fasttext" uses the lid.176 model at $CLIMPDF_FASTTEXT_MODEL and needs the fasttext package.
+LANGUAGE_BACKENDS = ("langdetect", "stopwords", "fasttext")
+DEFAULT_LANGUAGE_BACKEND = "langdetect"
+
+# "section" checks every section, "document" checks one sample of the whole document.
+LANGUAGE_MODES = ("section", "document")
+
+FASTTEXT_MODEL_ENV = "CLIMPDF_FASTTEXT_MODEL"
+DOCUMENT_SAMPLE_CHARS = 2000
+
+# Frequent function words of English and of the other languages most often mixed into
+# the corpus. Words shared between them ("a", "as", "to", "for", "at", "on", "do", "de", "die",
+# ...) or common in English scientific text ("et al.", "y", "um", "se", ...) are left out.
+ENGLISH_STOPWORDS = frozenset("""
+    the of and is are was were be been being that with by from this these those which or
+    we it its have has had not but can may than their there they our such also between into more most
+    other however both each then when where while would could should using used based within
+    """.split())
+FOREIGN_STOPWORDS = frozenset("""
+    le la les des du est une dans pour que qui sur au aux par pas sont ces cette
+    el los las del por con para una como más pero sus entre
+    der das und ist mit für von den zu auf dem sich nicht eine werden wird sind auch
+    il della di che per sono gli nel alla delle degli anche
+    dos uma não com pelo pela foram
+    het een van zijn niet voor wordt ook naar
+    och att det som av för på är med till har og af til er ikke blev blitt
+    się jest oraz że jak przez dla są jego które
+    em ao às das os pelos mais também
+    ja ovat että ei mikä joka myös sekä
+    yang untuk dengan dari ini itu
+    """.split())
+# Texts where more than this share of letters are not ASCII are not English.
+MAX_NON_ASCII_LETTERS = 0.1
+
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+_fasttext_model = None
+
+
+def _is_english_stopwords(text):
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return False
+
+    letters = sum(len(i) for i in words)
+    non_ascii = sum(1 for i in words for c in i if not c.isascii())
+    if non_ascii > MAX_NON_ASCII_LETTERS * letters:
+        return False
+
+    english_hits = 0
+    foreign_hits = 0
+    for i in words:
+        if i in ENGLISH_STOPWORDS:
+            english_hits += 1
+        elif i in FOREIGN_STOPWORDS:
+            foreign_hits += 1
+
+    # Text without any English function words is rejected, even if it is technical English,
+    # since the foreign word lists cannot cover every other language.
+    return english_hits > foreign_hits
+
+
+def _get_fasttext_model():
+    """Load the fastText language-ID model once per process."""
+    global _fasttext_model
+    if _fasttext_model is None:
+        try:
+            import fasttext
+        except ImportError:
+            raise ImportError("The fasttext language backend requires the fasttext package.")
+        model_path = os.environ.get(FASTTEXT_MODEL_ENV)
+        if not model_path:
+            raise ValueError(f"Set {FASTTEXT_MODEL_ENV} to the path of a fastText lid.176 model.")
+        _fasttext_model = fasttext.load_model(model_path)
+    return _fasttext_model
+
+
+def _is_english_fasttext(text):
+    # fastText predicts on a single line
+    labels, _ = _get_fasttext_model().predict(" ".join(text.split()))
+    return bool(labels) and labels[0] == "__label__en"
+
+
+def _is_english_langdetect(text):
+    try:
+        # detect() can throw an exception for numeric/symbol-only text
+        return detect(text) == "en"
+    except LangDetectException:
+        return False
+
+
+_BACKENDS = {
+    "stopwords": _is_english_stopwords,
+    "fasttext": _is_english_fasttext,
+    "langdetect": _is_english_langdetect,
+}
+
+
+def check_backend(backend=DEFAULT_LANGUAGE_BACKEND):
+    """Raise now, rather than on every document, if ``backend`` is unknown or cannot load its model."""
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown language backend: {backend}")
+    if backend == "fasttext":
+        _get_fasttext_model()
+
+
+def is_english(text, backend=DEFAULT_LANGUAGE_BACKEND):
+    """
+    Returns True if the text is detected as English by ``backend``, False otherwise.
+    Empty text, or text a backend cannot classify, is treated as not English.
+    """
+    if not text or text.strip() == "":
+        return False
+    return _BACKENDS[backend](text)
+
+
+def sample_text(texts, max_chars=DOCUMENT_SAMPLE_CHARS):
+    """Concatenate an even share of each of ``texts`` into one sample of at most ``max_chars``."""
+    texts = [i for i in texts if i]
+    if not texts:
+        return ""
+    share = max(max_chars // len(texts), 1)
+    return " ".join(i[:share] for i in texts)[:max_chars]
@@ -1,5 +1,9 @@
 # import sys
+import ast
+import csv
 import json
+import sqlite3
+from contextlib import closing
 from pathlib import Path
 
 import click
@@ -10,19 +14,119 @@ from ratelimit import limits, sleep_and_retry
 from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn
 
 from .schema import ParsedDocumentSchema
-from .utils import _collect_from_path
+from .utils import _collect_from_path, _discover_shards, _iter_shard, _load_shard_index
 
 SINGLE_REQUESTS_QUERY = (
     "http://titanv.gss.anl.gov:8983/solr/s2orc_corpus/select?df=corpus_id&" + "indent=true&q.op=OR&q={}&useParams="
 )
 
 
-def _metadata_one_file_db(input_path, output_dir, dbname, user, password, host, port, table_name):
+def _parse_author_names(raw_authors) -> list[str]:
+    """Parse a Python-literal list of ``{"first": ..., "last": ...}`` dicts into names."""
+    authors_list = []
+    try:
+        if raw_authors:
+            authors_data = ast.literal_eval(raw_authors)
+            for au in authors_data:
+                name = f"{au.get('first', '')} {au.get('last', '')}".strip()
+                if name:
+                    authors_list.append(name)
+    except Exception:
+        pass
+    return authors_list
 
-    conn = psycopg2.connect(dbname=dbname, user=user, password=password, host=host, port=port)
-    cur = conn.cursor()
 
-    corpus_id = input_path.stem.removesuffix("_processed")
+class _MetadataIndex:
+    """Read-only mapping from ``paper_id`` to rows of a metadata CSV.
+
+    Rows are looked up lazily from a SQLite index stored next to the CSV as ``<csv>.sqlite``.
+    The index is built once, by streaming the CSV, and rebuilt whenever the CSV is newer.
+    Supports ``in``, ``[]``, ``get`` and ``len`` like the ``dict`` it replaces.
+
+    Each row also carries ``author_names``, the names parsed from its ``authors`` column at
+    build time, so lookups never evaluate Python literals.
+    """
+
+    SCHEMA_VERSION = "2"
+
+    def __init__(self, csv_path: Path, index_path: Path | None = None, key: str = "paper_id"):
+        self.csv_path = Path(csv_path)
+        self.index_path = Path(index_path) if index_path else self.csv_path.with_name(self.csv_path.name + ".sqlite")
+        self.key = key
+
+        if not self._is_current():
+            self._build()
+
+        self._conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)
+        self._conn.execute("PRAGMA mmap_size = 1073741824")
+        self._len = int(self._conn.execute("SELECT value FROM meta WHERE name = 'rows'").fetchone()[0])
+
+    def _is_current(self) -> bool:
+        if not self.index_path.exists() or self.index_path.stat().st_mtime < self.csv_path.stat().st_mtime:
+            return False
+        try:
+            with closing(sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)) as conn:
+                version = conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        except sqlite3.Error:
+            return False
+        return version is not None and version[0] == self.SCHEMA_VERSION
+
+    def _build(self, batch_size: int = 10000):
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp_path.unlink(missing_ok=True)
+
+        conn = sqlite3.connect(tmp_path)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("CREATE TABLE rows (paper_id TEXT PRIMARY KEY, row TEXT NOT NULL)")
+        conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        pending = []
+        with open(self.csv_path, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                pending.append(self._encode_row(row))
+                if len(pending) >= batch_size:
+                    conn.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?)", pending)
+                    pending.clear()
+        conn.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?)", pending)
+
+        n_rows = conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [("version", self.SCHEMA_VERSION), ("rows", str(n_rows))])
+        conn.commit()
+        conn.close()
+        tmp_path.replace(self.index_path)
+
+    def _encode_row(self, row: dict) -> tuple[str, str]:
+        row["author_names"] = _parse_author_names(row.get("authors"))
+        return row[self.key], json.dumps(row)
+
+    def _decode_row(self, value: str) -> dict:
+        return json.loads(value)
+
+    def get(self, paper_id, default=None):
+        found = self._conn.execute("SELECT row FROM rows WHERE paper_id = ?", (str(paper_id),)).fetchone()
+        return self._decode_row(found[0]) if found else default
+
+    def __getitem__(self, paper_id) -> dict:
+        row = self.get(paper_id)
+        if row is None:
+            raise KeyError(paper_id)
+        return row
+
+    def __contains__(self, paper_id) -> bool:
+        return self._conn.execute("SELECT 1 FROM rows WHERE paper_id = ?", (str(paper_id),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def close(self):
+        self._conn.close()
+
+
+def _metadata_one_doc_db(corpus_id, sectioned_text, output_dir, cur, table_name):
 
     query = f"SELECT * FROM {table_name} WHERE corpus_id = {corpus_id} LIMIT 1;"  # noqa
     try:
@@ -31,9 +135,6 @@ def _metadata_one_file_db(input_path, output_dir, dbname, user, password, host,
         return False, corpus_id, str(e)
     rows = cur.fetchall()
 
-    with open(input_path, "r") as f:
-        sectioned_text = json.load(f)
-
     if rows:
         data = {desc.name: val for desc, val in zip(cur.description, rows[0])}
     else:
@@ -63,19 +164,29 @@ def _metadata_one_file_db(input_path, output_dir, dbname, user, password, host,
     with open(output_path, "w") as f:
         json.dump(document.model_dump(mode="json"), f)
 
-    conn.close()
-    cur.close()
-
     return True, corpus_id, None
 
 
-def _metadata_one_file_semanticscholar(input_path, output_dir):
+def _metadata_one_file_db(input_path, output_dir, dbname, user, password, host, port, table_name):
+
+    conn = psycopg2.connect(dbname=dbname, user=user, password=password, host=host, port=port)
+    cur = conn.cursor()
 
     corpus_id = input_path.stem.removesuffix("_processed")
 
     with open(input_path, "r") as f:
         sectioned_text = json.load(f)
 
+    result = _metadata_one_doc_db(corpus_id, sectioned_text, output_dir, cur, table_name)
+
+    conn.close()
+    cur.close()
+
+    return result
+
+
+def _metadata_one_doc_semanticscholar(corpus_id, sectioned_text, output_dir):
+
     data = {}
 
     abstract = sectioned_text.get("Abstract", "") or ""
@@ -105,19 +216,26 @@ def _metadata_one_file_semanticscholar(input_path, output_dir):
     return True, corpus_id, None
 
 
-def _metadata_one_file_solr(input_path, output_dir):
+def _metadata_one_file_semanticscholar(input_path, output_dir):
+
     corpus_id = input_path.stem.removesuffix("_processed")
 
     with open(input_path, "r") as f:
-        schema = json.load(f)
+        sectioned_text = json.load(f)
+
+    return _metadata_one_doc_semanticscholar(corpus_id, sectioned_text, output_dir)
+
+
+@sleep_and_retry
+@limits(calls=60, period=1)
+def _do_solr_request(corpus_id):
+    return requests.get(SINGLE_REQUESTS_QUERY.format(corpus_id), stream=True, timeout=10)
 
-    @sleep_and_retry
-    @limits(calls=60, period=1)
-    def _do_request(corpus_id):
-        return requests.get(SINGLE_REQUESTS_QUERY.format(corpus_id), stream=True, timeout=10)
+
+def _metadata_one_doc_solr(corpus_id, schema, output_dir):
 
     try:
-        response = _do_request(corpus_id)
+        response = _do_solr_request(corpus_id)
         abstract = response.json()["response"]["docs"][0]["abstract"][0]
     except Exception:
         return False, corpus_id, "Unable to obtain abstract from solr."
@@ -149,11 +267,60 @@ def _metadata_one_file_solr(input_path, output_dir):
     return True, corpus_id, None
 
 
+def _metadata_one_file_solr(input_path, output_dir):
+    corpus_id = input_path.stem.removesuffix("_processed")
+
+    with open(input_path, "r") as f:
+        schema = json.load(f)
+
+    return _metadata_one_doc_solr(corpus_id, schema, output_dir)
+
+
+def _metadata_one_shard(shard_path, output_dir, metadata_source, *args):
+    """Associate metadata with every record of a sectionized shard.
+
+    Records are ``{"corpus_id", "text"}`` objects; for the database source, a single
+    connection is shared by the whole shard.
+    """
+    conn = cur = None
+    if metadata_source == "db":
+        dbname, user, password, host, port, table_name = args
+        conn = psycopg2.connect(dbname=dbname, user=user, password=password, host=host, port=port)
+        cur = conn.cursor()
+
+    results = []
+    try:
+        for record in _iter_shard(shard_path):
+            corpus_id = str(record.get("corpus_id"))
+            try:
+                if metadata_source == "db":
+                    results.append(_metadata_one_doc_db(corpus_id, record["text"], output_dir, cur, table_name))
+                elif metadata_source == "semanticscholar":
+                    results.append(_metadata_one_doc_semanticscholar(corpus_id, record["text"], output_dir))
+                else:
+                    results.append(_metadata_one_doc_solr(corpus_id, record["text"], output_dir))
+            except Exception as e:
+                results.append((False, corpus_id, str(e)))
+    except Exception as e:
+        results.append((False, shard_path.name, str(e)))
+    finally:
+        if conn is not None:
+            cur.close()
+            conn.close()
+
+    return results
+
+
 def _metadata_workflow(source_dir, progress, metadata_source, *args):
 
-    collected_input_files = _collect_from_path(Path(source_dir))
-    progress.log("* Found " + str(len(collected_input_files)) + " input files.")
-    collected_input_files = [i for i in collected_input_files if i is not None and i.suffix.lower() == ".json"]
+    shards = _discover_shards(Path(source_dir))
+    if shards:
+        progress.log("* Found " + str(len(shards)) + " sectionized shards.")
+        collected_input_files = []
+    else:
+        collected_input_files = _collect_from_path(Path(source_dir))
+        progress.log("* Found " + str(len(collected_input_files)) + " input files.")
+        collected_input_files = [i for i in collected_input_files if i is not None and i.suffix.lower() == ".json"]
 
     output_dir = Path(str(Path(source_dir)) + "_with_metadata_" + metadata_source)
     output_dir.mkdir(exist_ok=True, parents=True)
@@ -161,7 +328,8 @@ def _metadata_workflow(source_dir, progress, metadata_source, *args):
     success_count = 0
     fail_count = 0
     task = progress.add_task(
-        "[green]Fetching metadata from " + str(metadata_source) + ":", total=len(collected_input_files)
+        "[green]Fetching metadata from " + str(metadata_source) + ":",
+        total=(len(_load_shard_index(Path(source_dir))) or None) if shards else len(collected_input_files),
     )
 
     if metadata_source == "db":
@@ -173,9 +341,15 @@ def _metadata_workflow(source_dir, progress, metadata_source, *args):
     else:
         raise ValueError("Invalid metadata source.")
 
-    results = Parallel(n_jobs=-1, return_as="generator")(
-        delayed(_metadata_one_file)(i, output_dir, *args) for i in collected_input_files
-    )
+    if shards:
+        shard_results = Parallel(n_jobs=-1, return_as="generator")(
+            delayed(_metadata_one_shard)(i, output_dir, metadata_source, *args) for i in shards
+        )
+        results = (result for shard_result in shard_results for result in shard_result)
+    else:
+        results = Parallel(n_jobs=-1, return_as="generator")(
+            delayed(_metadata_one_file)(i, output_dir, *args) for i in collected_input_files
+        )
 
     for success, stem, error in results:
         progress.update(task, advance=1)
@@ -1,170 +1,381 @@
+import json
 import re
 
+# Features of a chunk of text, in the order of the vectors returned by _heuristic_features.
+HEURISTIC_FEATURES = (
+    # --- Strong Positive Signals (Override prose) ---
+    "doi",
+    "url",
+    "citation_marker",
+    "et_al",
+    "preprint",
+    "journal_term",
+    # --- Medium Positive Signals ---
+    "strong_year",
+    "weak_year",
+    "pages",
+    "author_last_first",
+    "author_initial_first",
+    # --- Content Signals (Negative) ---
+    "prose",
+    "first_person",
+    "caption",
+    "plain_sentence",
+    # Author-list-like tokens
+    "initials",
+)
 
-def get_heuristic_score(text):
-    score = 0
-    text_lower = text.lower()
+# A chunk's score is the sum of the weights of its features, except that a gated feature
+# only counts while the score so far is below its gate. Features are added in the order of
+# HEURISTIC_FEATURES, and only those from "prose" on may be gated.
+DEFAULT_HEURISTIC_WEIGHTS = {
+    "doi": 8,
+    "url": 4,
+    "citation_marker": 6,
+    "et_al": 4,
+    "preprint": 5,
+    "journal_term": 3,
+    "strong_year": 2,
+    "weak_year": 1,
+    "pages": 3,
+    "author_last_first": 3,
+    "author_initial_first": 1,
+    "prose": -5,
+    "first_person": -3,
+    "caption": -10,
+    "plain_sentence": -2,
+    "initials": 3,
+}
+STRONG_SIGNAL_SCORE = 5
+PLAIN_SENTENCE_SCORE = 2
+DEFAULT_HEURISTIC_GATES = {
+    # If we have strong signals (DOI, et al), ignore prose markers and first person
+    "prose": STRONG_SIGNAL_SCORE,
+    "first_person": STRONG_SIGNAL_SCORE,
+    # Long prose-like line that didn't trigger positive signals is suspicious.
+    "plain_sentence": PLAIN_SENTENCE_SCORE,
+}
+# Chunks scoring at least this are references.
+DEFAULT_HEURISTIC_THRESHOLD = 1
+# Version of the weights files written by _ReferenceHeuristic.to_file.
+HEURISTIC_WEIGHTS_VERSION = 1
 
-    # --- Strong Positive Signals (Override prose) ---
-    # DOI
-    if re.search(r"10\.\d{4,}/", text):
-        score += 8
-    # URL / Retrieval / Access
-    if (
-        "http://" in text
-        or "https://" in text
-        or "retrieved from" in text_lower
-        or "accessed:" in text_lower
-        or "accessed," in text_lower
-        or "available at:" in text_lower
-    ):
-        score += 4
-    # Citation Markers at start: "[1]" or "1."
-    if re.match(r"^\[\d+\]", text.strip()) or re.match(r"^\d+\.", text.strip()):
-        score += 6
-    # "et al."
-    if "et al." in text_lower or "et al," in text_lower:
-        score += 4
-    # Specific Pre-print/Journal indicators
-    if "arxiv" in text_lower or "ssrn" in text_lower or "proc." in text_lower:
-        score += 5
-
-    # Common reference terms / Journal Abbreviations
-    journal_terms = [
-        "journal of",
-        "trans.",
-        "intl.",
-        "conf.",
-        "univ.",
-        "press",
-        "adv.",
-        "sci.",
-        "lett.",
-        "rev.",
-        "res.",
-        "phys.",
-        "chem.",
-        "biol.",
-        "geophys.",
-        "ann.",
-        "bull.",
-        "j.",
-        "am.",
-        "soc.",
-        "ieee",
-        "acm",
-        "nature",
-        "science",
-        "cell",
-        "publishing",
-        "publisher",
-        "editors",
-        "ed.",
-        "eds.",
-        "ltd",
-        "inc",
-        "literature cited",
-        "ph.d. thesis",
-        "doctoral thesis",
-        "springer",
+# Common reference terms / Journal Abbreviations
+JOURNAL_TERMS = [
+    "journal of",
+    "trans.",
+    "intl.",
+    "conf.",
+    "univ.",
+    "press",
+    "adv.",
+    "sci.",
+    "lett.",
+    "rev.",
+    "res.",
+    "phys.",
+    "chem.",
+    "biol.",
+    "geophys.",
+    "ann.",
+    "bull.",
+    "j.",
+    "am.",
+    "soc.",
+    "ieee",
+    "acm",
+    "nature",
+    "science",
+    "cell",
+    "publishing",
+    "publisher",
+    "editors",
+    "ed.",
+    "eds.",
+    "ltd",
+    "inc",
+    "literature cited",
+    "ph.d. thesis",
+    "doctoral thesis",
+    "springer",
+]
+
+# Common Sentence Starters / Connectives
+# REMOVED: "data", "method", "analysis", "result", "simulation" as they appear in titles
+PROSE_MARKERS = [
+    "however",
+    "therefore",
+    "although",
+    "furthermore",
+    "in conclusion",
+    "we found",
+    "results show",
+    "discussion",
+    "abstract",
+    "introduction",
+    "as shown in",
+    "the figure",
+    "the table",
+    "section",
+]
+
+# Substrings of the lowercased chunk that set the url, et_al and preprint features.
+URL_TERMS = ("retrieved from", "accessed:", "accessed,", "available at:")
+ET_AL_TERMS = ("et al.", "et al,")
+PREPRINT_TERMS = ("arxiv", "ssrn", "proc.")
+
+# Each pattern is only searched for once a substring it requires has been found. Patterns
+# that would begin with \b begin with a literal instead, checking the boundary with a
+# lookbehind, so that re can skip ahead to candidate positions.
+DOI_RE = re.compile(r"10\.\d{4,}/")
+# Matches (1999), 1999., , 1999 - the same as [\(,]\s*(19|20)\d{2}[\)\.]|\b(19|20)\d{2}[a-z]?\s*[\)\.]
+STRONG_YEAR_RE = re.compile(r"(?:19|20)(?<!\w..)\d{2}[a-z]?\s*[\)\.]")
+# \b(19|20)\d{2}\b
+WEAK_YEAR_RE = re.compile(r"(?:19|20)(?<!\w..)\d{2}\b")
+# \b(vol\.|no\.|pp\.|p\.)\s*\d+
+VOLUME_RE = re.compile(r"(?:vol\.(?<!\w....)|no\.(?<!\w...)|pp\.(?<!\w...)|p\.(?<!\w..))\s*\d+")
+PAGE_RANGE_RE = re.compile(r"\d+\s*:\s*\d+[-–]\d+")
+# \bwe\b|\bour\b
+FIRST_PERSON_RE = re.compile(r"we(?<!\w..)\b|our(?<!\w...)\b")
+# Anchored at the start of the stripped chunk.
+CITATION_MARKER_RE = re.compile(r"\[\d+\]|\d+\.")
+AUTHOR_LAST_FIRST_RE = re.compile(r"[A-Z][a-z]+,\s+[A-Z]\.")
+AUTHOR_INITIAL_FIRST_RE = re.compile(r"[A-Z]\.([A-Z]\.)?\s+[A-Z][a-z]+")
+NOT_AUTHOR_RE = re.compile(r"fig\.|table|vol\.|p\.|pp\.|u\.s\.")
+CAPTION_RE = re.compile(r"(figure|fig\.|table|tab\.)\s*\d+")
+
+
+def _contains_any(text, terms):
+    for term in terms:
+        if term in text:
+            return True
+    return False
+
+
+# Features that _cheap_features finds with anchored matches, prefiltered searches and a
+# few substring checks. The rest need a full scan of a term list, pattern or the tokens.
+CHEAP_FEATURES = frozenset(
+    (
+        "doi",
+        "url",
+        "citation_marker",
+        "et_al",
+        "preprint",
+        "strong_year",
+        "weak_year",
+        "author_last_first",
+        "author_initial_first",
+        "caption",
+    )
+)
+
+
+def _cheap_features(text, text_lower, stripped, lower_stripped):
+    """Return the HEURISTIC_FEATURES vector of one chunk with only CHEAP_FEATURES set; the rest are None."""
+    has_year = "19" in text or "20" in text
+    strong_year = has_year and STRONG_YEAR_RE.search(text) is not None
+    weak_year = has_year and not strong_year and WEAK_YEAR_RE.search(text) is not None
+    author_initial_first = (
+        AUTHOR_INITIAL_FIRST_RE.match(stripped) is not None and NOT_AUTHOR_RE.match(lower_stripped) is None
+    )
+
+    return [
+        "10." in text and DOI_RE.search(text) is not None,
+        "http://" in text or "https://" in text or _contains_any(text_lower, URL_TERMS),
+        CITATION_MARKER_RE.match(stripped) is not None,
+        _contains_any(text_lower, ET_AL_TERMS),
+        _contains_any(text_lower, PREPRINT_TERMS),
+        None,
+        strong_year,
+        weak_year,
+        None,
+        AUTHOR_LAST_FIRST_RE.match(stripped) is not None,
+        author_initial_first,
+        None,
+        None,
+        CAPTION_RE.match(lower_stripped) is not None,
+        None,
+        None,
     ]
 
-    # Check for whole words to avoid false matches
-    for term in journal_terms:
-        if term in text_lower:
-            score += 3
-            break  # One is enough
 
-    # --- Medium Positive Signals ---
-    # Year (1900-2029) - Context aware
-    # Matches (1999), 1999., , 1999
-    if re.search(r"[\(,]\s*(19|20)\d{2}[\)\.]", text) or re.search(r"\b(19|20)\d{2}[a-z]?\s*[\)\.]", text):
-        score += 2
-    elif re.search(r"\b(19|20)\d{2}\b", text):
-        # Raw year, less strong
-        score += 1
-
-    # Pages / Vol
-    if re.search(r"\b(vol\.|no\.|pp\.|p\.)\s*\d+", text_lower) or re.search(r"\d+\s*:\s*\d+[-–]\d+", text):
-        score += 3
-
-    # Author-like patterns
-    # "Smith, J." or "Smith, J.A."
-    if re.match(r"^[A-Z][a-z]+,\s+[A-Z]\.", text.strip()):
-        score += 3
-    # "J. Smith" or "J.A. Smith" - riskier
-    if re.match(r"^[A-Z]\.([A-Z]\.)?\s+[A-Z][a-z]+", text.strip()) and not re.match(
-        r"^(fig\.|table|vol\.|p\.|pp\.|u\.s\.)", text_lower.strip()
+def _fill_features(features, text, text_lower, stripped):
+    """Set the features left as None by _cheap_features."""
+    has_volume = "p." in text_lower or "vol." in text_lower or "no." in text_lower
+    pages = (has_volume and VOLUME_RE.search(text_lower) is not None) or (
+        ":" in text and PAGE_RANGE_RE.search(text) is not None
+    )
+    first_person = ("we" in text_lower or "our" in text_lower) and FIRST_PERSON_RE.search(text_lower) is not None
+
+    # Relatively large percentage of single-character tokens resembles lists of authors
+    tokens = text.split(" ")
+    percentage_single_char = list(map(len, tokens)).count(1) / len(tokens)
+    if "." in text:
+        percentage_single_char_with_period = len([i for i in tokens if len(i) == 2 and i[1] == "."]) / len(tokens)
+    else:
+        percentage_single_char_with_period = 0.0
+
+    features[_JOURNAL_TERM] = _contains_any(text_lower, JOURNAL_TERMS)
+    features[_PAGES] = pages
+    features[_PROSE] = _contains_any(text_lower, PROSE_MARKERS)
+    features[_FIRST_PERSON] = first_person
+    features[_PLAIN_SENTENCE] = stripped.endswith(".") and len(text.split()) > 15
+    features[_INITIALS] = percentage_single_char + percentage_single_char_with_period > 0.10
+    return features
+
+
+def _heuristic_features(text):
+    """Return the 0/1 vector of HEURISTIC_FEATURES for one chunk of text.
+
+    The chunk is lowercased, stripped and split once, and each term list is scanned only
+    until its first hit.
+    """
+    text_lower = text.lower()
+    stripped = text.strip()
+    features = _cheap_features(text, text_lower, stripped, text_lower.strip())
+    return tuple(_fill_features(features, text, text_lower, stripped))
+
+
+_JOURNAL_TERM, _PAGES, _PROSE, _FIRST_PERSON, _PLAIN_SENTENCE, _INITIALS = (
+    HEURISTIC_FEATURES.index(i)
+    for i in ("journal_term", "pages", "prose", "first_person", "plain_sentence", "initials")
+)
+GATEABLE_FEATURES = HEURISTIC_FEATURES[_PROSE:]
+
+
+class _ReferenceHeuristic:
+    """Weights, gates and threshold that turn HEURISTIC_FEATURES vectors into reference scores.
+
+    ``weights`` maps every feature to a weight and ``gates`` maps some GATEABLE_FEATURES to
+    the score they stop counting at. The defaults are the hand-tuned heuristic; tuned tables
+    are written and read as versioned JSON files by ``to_file`` and ``from_file``.
+    """
+
+    def __init__(
+        self, weights=DEFAULT_HEURISTIC_WEIGHTS, gates=DEFAULT_HEURISTIC_GATES, threshold=DEFAULT_HEURISTIC_THRESHOLD
     ):
-        score += 1
+        missing = set(HEURISTIC_FEATURES) - set(weights)
+        unknown = set(weights) - set(HEURISTIC_FEATURES)
+        if missing or unknown:
+            raise ValueError(f"Weights must cover exactly {', '.join(HEURISTIC_FEATURES)}")
+        unknown = set(gates) - set(GATEABLE_FEATURES)
+        if unknown:
+            raise ValueError(f"Only {', '.join(GATEABLE_FEATURES)} can be gated, not {', '.join(sorted(unknown))}")
 
-    # --- Content Signals (Negative) ---
-    # Common Sentence Starters / Connectives
-    # REMOVED: "data", "method", "analysis", "result", "simulation" as they appear in titles
-    prose_markers = [
-        "however",
-        "therefore",
-        "although",
-        "furthermore",
-        "in conclusion",
-        "we found",
-        "results show",
-        "discussion",
-        "abstract",
-        "introduction",
-        "as shown in",
-        "the figure",
-        "the table",
-        "section",
-    ]
+        self.weights = dict(weights)
+        self.gates = dict(gates)
+        self.threshold = threshold
 
-    for marker in prose_markers:
-        if marker in text_lower:
-            # If we have strong signals (DOI, et al), ignore prose markers
-            if score < 5:
-                score -= 5
-            break
+        self.weight_vector = tuple(weights[i] for i in HEURISTIC_FEATURES)
+        # (weight, gate) of each gateable feature, with None for ungated ones
+        self._tail = tuple((weights[i], gates.get(i)) for i in GATEABLE_FEATURES)
+        # Least and most that journal_term and pages, which _cheap_features leaves unknown, can add
+        unknown_weights = (weights["journal_term"], weights["pages"])
+        self._unknown_low = sum(min(w, 0) for w in unknown_weights)
+        self._unknown_high = sum(max(w, 0) for w in unknown_weights)
 
-    # First person - References rarely use "we" or "our" unless in title? Unlikely.
-    if re.search(r"\bwe\b", text_lower) or re.search(r"\bour\b", text_lower):
-        if score < 5:
-            score -= 3
+    @classmethod
+    def from_file(cls, path):
+        """Load a weights file written by ``to_file``, e.g. by develop_ref_heuristic.py."""
+        with open(path, "r") as f:
+            config = json.load(f)
 
-    # Figure/Table captions
-    if re.match(r"^(figure|fig\.|table|tab\.)\s*\d+", text_lower.strip()):
-        score -= 10
+        if config.get("version") != HEURISTIC_WEIGHTS_VERSION:
+            raise ValueError(
+                f"Unsupported weights file version {config.get('version')} in {path}, "
+                f"expected {HEURISTIC_WEIGHTS_VERSION}"
+            )
+        if tuple(config.get("features", ())) != HEURISTIC_FEATURES:
+            raise ValueError(
+                f"Weights in {path} were tuned for different features than {', '.join(HEURISTIC_FEATURES)}"
+            )
 
-    # Single sentence ending in period without citation features
-    # Heuristic: References are often not full sentences or are very structured.
-    # Long prose-like line that didn't trigger positive signals is suspicious.
-    if len(text.split()) > 15 and text.strip().endswith(".") and score < 2:
-        score -= 2
+        return cls(config["weights"], config.get("gates", {}), config.get("threshold", DEFAULT_HEURISTIC_THRESHOLD))
 
-    #  Relatively large percentage of single-character tokens resembles lists of authors
-    percentage_single_char = len([i for i in text.split(" ") if len(i) == 1]) / len(text.split(" "))
-    percentage_single_char_with_period = len([i for i in text.split(" ") if len(i) == 2 and i.endswith(".")]) / len(
-        text.split(" ")
-    )
-    if percentage_single_char + percentage_single_char_with_period > 0.10:
-        score += 3
+    def to_dict(self):
+        return {
+            "version": HEURISTIC_WEIGHTS_VERSION,
+            "features": list(HEURISTIC_FEATURES),
+            "weights": self.weights,
+            "gates": self.gates,
+            "threshold": self.threshold,
+        }
 
-    return score
+    def to_file(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
 
+    def score(self, features):
+        # Signals before the prose markers simply add up
+        score = sum(w for f, w in zip(features[:_PROSE], self.weight_vector) if f)
+        for f, (w, gate) in zip(features[_PROSE:], self._tail):
+            if f and (gate is None or score < gate):
+                score += w
+        return score
 
-def split_references(text):
+    def bounds(self, features):
+        """Return ``(low, high)`` bounds on the score of a vector from _cheap_features.
+
+        Follows ``score``, adding the least and most each unknown feature could add. A gated
+        feature can only count while the lowest possible score so far is below its gate.
+        """
+        known = sum(w for f, w in zip(features[:_PROSE], self.weight_vector) if f)
+        low, high = known + self._unknown_low, known + self._unknown_high
+        for f, (w, gate) in zip(features[_PROSE:], self._tail):
+            if f is False or (gate is not None and low >= gate):
+                continue
+            if f and (gate is None or high < gate):
+                low, high = low + w, high + w
+            elif w < 0:
+                low += w
+            else:
+                high += w
+        return low, high
+
+    def reaches_threshold(self, chunk, threshold):
+        """Return whether a chunk scores at least ``threshold``.
+
+        The cheap features are found first. If they already bound the score on one side of
+        ``threshold``, the rest are never computed.
+        """
+        text_lower = chunk.lower()
+        stripped = chunk.strip()
+        features = _cheap_features(chunk, text_lower, stripped, text_lower.strip())
+
+        low, high = self.bounds(features)
+        if low >= threshold:
+            return True
+        if high < threshold:
+            return False
+        return self.score(_fill_features(features, chunk, text_lower, stripped)) >= threshold
+
+
+DEFAULT_REFERENCE_HEURISTIC = _ReferenceHeuristic()
+
+
+def get_heuristic_score(text):
+    return DEFAULT_REFERENCE_HEURISTIC.score(_heuristic_features(text))
+
+
+def split_references(text, threshold=None, patience=2, heuristic=DEFAULT_REFERENCE_HEURISTIC):
     """
     Splits the text into (content, references).
     Returns (content_str, references_str).
     If no references found, references_str is None.
+
+    Paragraphs are classified from the end. A paragraph scoring at least ``threshold`` (the
+    heuristic's own threshold by default) is a reference, and scanning stops after more than
+    ``patience`` consecutive paragraphs that are not. Paragraphs are only scored as far as
+    needed to tell which side of ``threshold`` they fall on.
     """
     # Split by double newline (paragraphs)
     chunks = re.split(r"\n\n+", text)
 
-    threshold = 1
+    if threshold is None:
+        threshold = heuristic.threshold
 
     split_index = len(chunks)
 
-    patience = 2
     consecutive_low = 0
 
     for i in range(len(chunks) - 1, -1, -1):
@@ -172,9 +383,7 @@ def split_references(text):
         if not chunk:
             continue
 
-        score = get_heuristic_score(chunk)
-
-        if score >= threshold:
+        if heuristic.reaches_threshold(chunk, threshold):
             split_index = i
             consecutive_low = 0
         else:
@@ -1,21 +1,65 @@
-import gzip
+import base64
 import html
 import json
+import queue
 import re
+import string
+import threading
+import time
 import unicodedata
+import zlib
+from collections import Counter, defaultdict
 from pathlib import Path
 
 import click
-from joblib import Parallel, delayed
-from langdetect import LangDetectException, detect
+from joblib import Parallel, cpu_count, delayed
 from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn
 
-from .utils import _collect_from_path
+from .extract_references import _resplit_references
+from .language import (
+    DEFAULT_LANGUAGE_BACKEND,
+    LANGUAGE_BACKENDS,
+    LANGUAGE_MODES,
+    check_backend,
+    is_english,
+    sample_text,
+)
+from .ref_extraction_utils import DEFAULT_REFERENCE_HEURISTIC, _ReferenceHeuristic
+from .utils import (
+    SHARD_DIR,
+    _append_shard_index,
+    _collect_from_path,
+    _iter_gzip_lines,
+    _load_shard_index,
+    _read_batch_index,
+    _write_json,
+    _write_shard,
+)
 
 NUMERIC_SPECIAL_THRESHOLD = 30
 MIN_CONTENT_CHARS = 40
 MIN_ALPHA_CHARS = 20
 
+# Legacy per-document inputs are sent to workers in groups of this many files.
+FILES_PER_TASK = 256
+
+ASCII_LETTERS = string.ascii_letters.encode()
+ASCII_DIGITS = string.digits.encode()
+NON_ASCII_DIGIT_RE = re.compile(r"[^\x00-\x7f\D]")
+ROMAN_NUMERAL_RE = re.compile(r"[ivxlcdm]+[.)]?")
+SINGLE_LETTER_RE = re.compile(r"[a-zA-Z][.)]?")
+FIGURE_LABEL_RE = re.compile(r"(table|fig|figure)\s*[-.]?\s*\d*")
+HEADER_TRAILING_PUNCT_RE = re.compile(r"\s*[:.\-–—]+\s*$")
+
+# Batches without a block index are split into this many compressed bytes per task.
+BYTES_PER_TASK = 8 << 20
+
+# Batch progress is saved at least this many seconds apart, and whenever a batch completes.
+CHECKPOINT_INTERVAL = 30
+
+# "json" writes one file per corpus_id, "jsonl.gz" writes shards under <output>/shards.
+OUTPUT_FORMATS = ("json", "jsonl.gz")
+
 
 unneeded_sections_no_skip_remaining = [
     # "abstract",
@@ -70,28 +114,106 @@ unneeded_sections_skip_remaining = [
     "openaccess",
 ]
 
+# Categories returned by _SectionVocabulary.classify, in order of precedence.
+SECTION_SKIP_REMAINING = "skip_remaining"
+SECTION_UNNEEDED = "unneeded"
+SECTION_LAST_NEEDED = "last_needed"
 
-def is_english(text):
-    if not text or text.strip() == "":
-        return False
-    try:
-        return detect(text) == "en"
-    except LangDetectException:
-        return False
 
+class _SectionVocabulary:
+    """Section-name vocabularies, each compiled once into a single alternation pattern.
 
-def is_string_valid(string):
-    if re.search(r"\d", string):
-        digit_count = len(re.findall(r"\d", string))
-        total_count = len(string)
-        if total_count == 0:
-            return False
+    ``classify`` takes a header with whitespace removed and lowercased, and returns
+    SECTION_SKIP_REMAINING, SECTION_UNNEEDED, SECTION_LAST_NEEDED or None. A header that
+    contains words from several vocabularies gets the first of these categories.
+    """
+
+    def __init__(self, no_skip_remaining, but_skip_remaining, skip_remaining):
+        self.no_skip_remaining = [self._compact(i) for i in no_skip_remaining]
+        self.but_skip_remaining = [self._compact(i) for i in but_skip_remaining]
+        self.skip_remaining = [self._compact(i) for i in skip_remaining]
+
+        self._unneeded = self._compile(self.no_skip_remaining)
+        self._patterns = [
+            (category, pattern)
+            for category, pattern in (
+                (SECTION_SKIP_REMAINING, self._compile(self.skip_remaining)),
+                (SECTION_UNNEEDED, self._unneeded),
+                (SECTION_LAST_NEEDED, self._compile(self.but_skip_remaining)),
+            )
+            if pattern is not None
+        ]
+
+    @staticmethod
+    def _compact(word):
+        return "".join(word.split()).lower()
+
+    @staticmethod
+    def _compile(words):
+        words = sorted({i for i in words if i}, key=len, reverse=True)
+        return re.compile("|".join(re.escape(i) for i in words)) if words else None
+
+    @classmethod
+    def from_file(cls, path):
+        """Load vocabularies from a JSON object keyed by the module-level list names.
+
+        Missing keys keep the default list, e.g.
+        ``{"unneeded_sections_skip_remaining": ["references", "appendix"]}``.
+        """
+        with open(path, "r") as f:
+            config = json.load(f)
+
+        defaults = {
+            "unneeded_sections_no_skip_remaining": unneeded_sections_no_skip_remaining,
+            "needed_sections_but_skip_remaining": needed_sections_but_skip_remaining,
+            "unneeded_sections_skip_remaining": unneeded_sections_skip_remaining,
+        }
+        unknown = set(config) - set(defaults)
+        if unknown:
+            raise ValueError(f"Unknown section lists in {path}: {', '.join(sorted(unknown))}")
+
+        return cls(*(config.get(key, default) for key, default in defaults.items()))
+
+    def classify(self, compact_header):
+        for category, pattern in self._patterns:
+            if pattern.search(compact_header):
+                return category
+        return None
+
+    def is_unneeded(self, compact_header):
+        return self._unneeded is not None and self._unneeded.search(compact_header) is not None
+
+
+DEFAULT_SECTION_VOCABULARY = _SectionVocabulary(
+    unneeded_sections_no_skip_remaining, needed_sections_but_skip_remaining, unneeded_sections_skip_remaining
+)
+
+
+def _char_stats(text):
+    """Count digits, ASCII letters and ASCII letters-or-digits in ``text``.
+
+    Counts are taken over the ASCII bytes of ``text`` with ``bytes.translate``; digits also
+    include any non-ASCII decimal digits, so they match what ``\\d`` would find.
+    """
+    ascii_bytes = text.encode("ascii", "ignore")
+    n_ascii = len(ascii_bytes)
+    letter_count = n_ascii - len(ascii_bytes.translate(None, ASCII_LETTERS))
+    ascii_digit_count = n_ascii - len(ascii_bytes.translate(None, ASCII_DIGITS))
+
+    digit_count = ascii_digit_count
+    if n_ascii != len(text):
+        digit_count += len(NON_ASCII_DIGIT_RE.findall(text))
 
+    return digit_count, letter_count, letter_count + ascii_digit_count
+
+
+def _char_stats_are_valid(total_count, digit_count, alnum_count):
+    if digit_count:
         numeric_percentage = (digit_count / total_count) * 100
         if numeric_percentage > NUMERIC_SPECIAL_THRESHOLD:
             return False
 
-        special_count = len(re.findall(r"[^a-zA-Z0-9]", string))
+        special_count = total_count - alnum_count
         special_percentage = (special_count / total_count) * 100
         if special_percentage > NUMERIC_SPECIAL_THRESHOLD:
             return False
@@ -99,6 +221,11 @@ def is_string_valid(string):
     return True
 
 
+def is_string_valid(string):
+    digit_count, _, alnum_count = _char_stats(string)
+    return _char_stats_are_valid(len(string), digit_count, alnum_count)
+
+
 def _line_spacing_resembles_header(line, splitlines, index):
     if index < 2 or index >= len(splitlines) - 1:
         return False
@@ -156,43 +283,42 @@ def _normalize_text(text):
         return ""
     text = unicodedata.normalize("NFD", text)
     text = html.unescape(text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return " ".join(text.split())
 
 
 def _normalize_header(header):
     header = _normalize_text(header)
-    header = re.sub(r"\s*[:.\-–—]+\s*$", "", header).strip()
+    header = HEADER_TRAILING_PUNCT_RE.sub("", header).strip()
     return header
 
 
-def _header_is_noise(header):
+def _header_is_noise(header, vocabulary=DEFAULT_SECTION_VOCABULARY):
     if not header:
         return True
 
     normalized = _normalize_header(header)
     lowered = normalized.lower()
-    compact = re.sub(r"\s+", "", lowered)
+    compact = "".join(lowered.split())
 
     if not normalized:
         return True
 
     # enumeration fragments like "v.", "ii", "a)"
-    if re.fullmatch(r"[ivxlcdm]+[.)]?", lowered):
+    if ROMAN_NUMERAL_RE.fullmatch(lowered):
         return True
-    if re.fullmatch(r"[a-zA-Z][.)]?", normalized):
+    if SINGLE_LETTER_RE.fullmatch(normalized):
         return True
 
     # table / figure labels
-    if re.fullmatch(r"(table|fig|figure)\s*[-.]?\s*\d*", lowered):
+    if FIGURE_LABEL_RE.fullmatch(lowered):
         return True
 
     # mostly symbols / numbers
-    alpha_count = len(re.findall(r"[A-Za-z]", normalized))
+    digit_count, alpha_count, alnum_count = _char_stats(normalized)
     if alpha_count < 2:
         return True
 
-    if not is_string_valid(normalized):
+    if not _char_stats_are_valid(len(normalized), digit_count, alnum_count):
         return True
 
     # noisy one-token fragments that are not likely real section headers
@@ -200,7 +326,7 @@ def _header_is_noise(header):
         return True
 
     # catch normalized "table", "figure", etc.
-    if any(j in compact for j in unneeded_sections_no_skip_remaining):
+    if vocabulary.is_unneeded(compact):
         if len(normalized.split()) <= 3:
             return True
 
@@ -212,14 +338,25 @@ def _content_is_substantive(content):
     if len(content) < MIN_CONTENT_CHARS:
         return False
 
-    alpha_chars = len(re.findall(r"[A-Za-z]", content))
+    _, alpha_chars, _ = _char_stats(content)
     if alpha_chars < MIN_ALPHA_CHARS:
         return False
 
     return True
 
 
-def _sectionize_item_v2(item):
+def _sectionize_item_v2(
+    item,
+    language=DEFAULT_LANGUAGE_BACKEND,
+    language_mode="section",
+    vocabulary=DEFAULT_SECTION_VOCABULARY,
+    references=None,
+):
+    """Sectionize one document into a ``{header: paragraph}`` dict.
+
+    With a ``references`` heuristic, references are also split out of the last section
+    into a "References" entry, as extract-refs would.
+    """
     title = _normalize_text(_get_first(item, "title"))
     abstract = _normalize_text(_get_first(item, "abstract"))
     paragraphs = [_normalize_text(p) for p in _get_list(item, "paragraph")]
@@ -236,26 +373,35 @@ def _sectionize_item_v2(item):
 
     actual_headers_count = 0
 
+    if language_mode == "document":
+        document_is_english = is_english(sample_text(paragraphs), language)
+
     for header, content in zip(section_headers, paragraphs):
-        if _header_is_noise(header):
+        if _header_is_noise(header, vocabulary):
             continue
 
         compare_header = "".join(header.split()).lower()
+        category = vocabulary.classify(compare_header)
 
-        if any(j in compare_header for j in unneeded_sections_skip_remaining):
+        if category == SECTION_SKIP_REMAINING:
             break
 
-        should_stop_after = any(j in compare_header for j in needed_sections_but_skip_remaining)
-
-        if any(j in compare_header for j in unneeded_sections_no_skip_remaining):
+        if category == SECTION_UNNEEDED:
             continue
 
+        should_stop_after = category == SECTION_LAST_NEEDED
+
         if not _content_is_substantive(content):
             if should_stop_after:
                 break
             continue
 
-        if is_english(content) and is_string_valid(content):
+        if language_mode == "document":
+            content_is_english = document_is_english
+        else:
+            content_is_english = is_english(content, language)
+
+        if content_is_english and is_string_valid(content):
             sectioned_text[header] = content
             actual_headers_count += 1
 
@@ -266,10 +412,31 @@ def _sectionize_item_v2(item):
     if not content_keys and actual_headers_count == 0:
         return (False, sectioned_text, "No valid content sections found")
 
+    if references is not None:
+        _resplit_references(sectioned_text, references)
+
     return (True, sectioned_text, None)
 
 
-def _sectionize_one_file(input_path: Path, output_dir: Path):
+def _sectionize_one_file(
+    input_path: Path,
+    output_dir: Path,
+    failed_ids=frozenset(),
+    records=None,
+    language=DEFAULT_LANGUAGE_BACKEND,
+    language_mode="section",
+    vocabulary=DEFAULT_SECTION_VOCABULARY,
+    pretty=False,
+    references=None,
+    sharded_ids=frozenset(),
+):
+    """Sectionize one per-document JSON file.
+
+    The result is written to ``<corpus_id>.json``, indented if ``pretty``, or appended to
+    ``records`` when a list is given so the caller can write it into a shard. Documents
+    whose ``<corpus_id>.json`` exists, or with ``records`` whose corpus_id is in
+    ``sharded_ids``, are skipped.
+    """
     try:
         with open(input_path, "r") as f:
             doc = json.load(f)
@@ -278,15 +445,20 @@ def _sectionize_one_file(input_path: Path, output_dir: Path):
         corpus_id = _get_corpus_id(item, fallback_stem=input_path.stem)
         output_file = output_dir / Path(corpus_id + ".json")
 
-        if output_file.exists():
+        if output_file.exists() if records is None else corpus_id in sharded_ids:
             return (True, corpus_id, None, "skipped_existing")
 
-        success, sectioned_text, error = _sectionize_item_v2(item)
+        if corpus_id in failed_ids:
+            return (True, corpus_id, None, "skipped_failure")
+
+        success, sectioned_text, error = _sectionize_item_v2(item, language, language_mode, vocabulary, references)
         if not success:
             return (False, corpus_id, error, "failed")
 
-        with open(output_file, "w") as f:
-            json.dump(sectioned_text, f, indent=4)
+        if records is not None:
+            records.append({"corpus_id": corpus_id, "text": sectioned_text})
+        else:
+            _write_json(output_file, sectioned_text, pretty)
 
         return (True, corpus_id, None, "written")
 
@@ -294,6 +466,42 @@ def _sectionize_one_file(input_path: Path, output_dir: Path):
         return (False, input_path.stem, str(e), "failed")
 
 
+def _sectionize_file_batch(
+    input_paths: list[Path],
+    output_dir: Path,
+    failed_ids=frozenset(),
+    shard_path=None,
+    language=DEFAULT_LANGUAGE_BACKEND,
+    language_mode="section",
+    vocabulary=DEFAULT_SECTION_VOCABULARY,
+    pretty=False,
+    references=None,
+    sharded_ids=frozenset(),
+):
+    records = [] if shard_path is not None else None
+    results = [
+        _sectionize_one_file(
+            i, output_dir, failed_ids, records, language, language_mode, vocabulary, pretty, references, sharded_ids
+        )
+        for i in input_paths
+    ]
+    if records:
+        _write_shard(shard_path, records)
+    return results
+
+
+def _shard_name(batch_file: Path, source: Path) -> str:
+    """Name a batch's output shard after its path under ``source``, so that
+    ``all_terms/batches/batch_000001.jsonl.gz`` and ``ids/batches/batch_000001.jsonl.gz``
+    do not collide.
+    """
+    try:
+        parts = batch_file.relative_to(source).parts
+    except ValueError:
+        return batch_file.name
+    return "_".join(i for i in parts if i != "batches")
+
+
 def _discover_batch_files(source: Path):
     batch_files = []
 
@@ -301,9 +509,10 @@ def _discover_batch_files(source: Path):
     if direct_batches:
         batch_files.extend(direct_batches)
 
-    nested_batches = sorted((source / "all_terms" / "batches").glob("*.jsonl.gz"))
-    if nested_batches:
-        batch_files.extend(i for i in nested_batches if i not in batch_files)
+    for nested_dir in (source / "all_terms" / "batches", source / "ids" / "batches"):
+        nested_batches = sorted(nested_dir.glob("*.jsonl.gz"))
+        if nested_batches:
+            batch_files.extend(i for i in nested_batches if i not in batch_files)
 
     return batch_files
 
@@ -317,6 +526,7 @@ def _load_batch_checkpoint(checkpoint_path: Path):
     return {
         "completed_batches": [],
         "failures": [],
+        "batch_progress": {},
     }
 
 
@@ -324,65 +534,350 @@ def _write_batch_checkpoint(checkpoint_path: Path, checkpoint_data: dict):
     checkpoint_path.write_text(json.dumps(checkpoint_data, indent=2))
 
 
-def _sectionize_batch_file(batch_file: Path, output_dir: Path):
-    batch_successes = 0
-    batch_failures = []
+def _bitmap_bits(bitmap: str) -> int:
+    """Decode a bitmap stored as base64 of zlib-compressed, little-endian bytes, where bit
+    ``n - 1`` stands for line ``n``. ``""`` is the empty bitmap.
+    """
+    return int.from_bytes(zlib.decompress(base64.b64decode(bitmap)), "little") if bitmap else 0
+
+
+def _mark_lines(bitmap: str, line_numbers) -> str:
+    """Set the bits of ``line_numbers`` in a bitmap from _bitmap_bits."""
+    bits = _bitmap_bits(bitmap)
+    for n in line_numbers:
+        bits |= 1 << (n - 1)
+    if not bits:
+        return ""
+    return base64.b64encode(zlib.compress(bits.to_bytes((bits.bit_length() + 7) // 8, "little"))).decode()
+
+
+def _record_batch_progress(checkpoint_data: dict, batch_file: str, last_line: int, failures: list):
+    """Note that every line of ``batch_file`` up to ``last_line`` is done, and which of them failed.
+
+    ``checkpoint_data["batch_progress"][batch_file]`` holds the last completed line and a
+    bitmap of the failed lines, so an interrupted batch resumes after ``last_line``. Lines
+    redone after an interruption, e.g. a shard's whole block, are only listed in
+    ``checkpoint_data["failures"]`` the first time they fail.
+    """
+    record = checkpoint_data.setdefault("batch_progress", {}).setdefault(batch_file, {"line": 0, "failed": ""})
+    failed = _bitmap_bits(record["failed"])
+    new_failures = []
+    for failure in failures:
+        bit = 1 << (failure["line_number"] - 1)
+        if not failed & bit:
+            failed |= bit
+            new_failures.append(failure)
+
+    record["line"] = max(record["line"], last_line)
+    record["failed"] = _mark_lines(record["failed"], [i["line_number"] for i in new_failures])
+    checkpoint_data["failures"].extend(new_failures)
+
+
+def _sectionize_docs(
+    numbered_docs,
+    batch_file: Path,
+    output_dir: Path,
+    records: list | None = None,
+    language=DEFAULT_LANGUAGE_BACKEND,
+    language_mode="section",
+    vocabulary=DEFAULT_SECTION_VOCABULARY,
+    skip_existing=True,
+    pretty=False,
+    references=None,
+):
+    """Sectionize ``(line_number, doc)`` pairs belonging to ``batch_file``.
+
+    Each doc may be a parsed dict or a raw JSON line. Without ``records``, one JSON file is
+    written per corpus_id, indented if ``pretty``, and existing files are skipped if
+    ``skip_existing``; with it, results are appended to ``records`` for the caller to write
+    into a shard. References are split out with the ``references`` heuristic, if given.
+    """
+    successes = 0
+    failures = []
     skipped_existing = 0
 
-    with gzip.open(batch_file, "rt", encoding="utf-8") as f:
-        for line_number, line in enumerate(f, start=1):
-            line = line.strip()
-            if not line:
+    for line_number, doc in numbered_docs:
+        try:
+            if isinstance(doc, str):
+                doc = json.loads(doc)
+            item = _extract_item_from_doc(doc)
+            corpus_id = _get_corpus_id(item, fallback_stem=f"{batch_file.stem}_line_{line_number}")
+            output_file = output_dir / Path(corpus_id + ".json")
+
+            if records is None and skip_existing and output_file.exists():
+                skipped_existing += 1
                 continue
 
-            try:
-                doc = json.loads(line)
-                item = _extract_item_from_doc(doc)
-                corpus_id = _get_corpus_id(item, fallback_stem=f"{batch_file.stem}_line_{line_number}")
-                output_file = output_dir / Path(corpus_id + ".json")
-
-                if output_file.exists():
-                    skipped_existing += 1
-                    continue
-
-                success, sectioned_text, error = _sectionize_item_v2(item)
-                if not success:
-                    batch_failures.append(
-                        {
-                            "corpus_id": corpus_id,
-                            "batch_file": str(batch_file),
-                            "line_number": line_number,
-                            "error": error,
-                        }
-                    )
-                    continue
-
-                with open(output_file, "w") as out_f:
-                    json.dump(sectioned_text, out_f, indent=4)
-
-                batch_successes += 1
-
-            except Exception as e:
-                corpus_id = f"{batch_file.stem}_line_{line_number}"
-                batch_failures.append(
+            success, sectioned_text, error = _sectionize_item_v2(item, language, language_mode, vocabulary, references)
+            if not success:
+                failures.append(
                     {
                         "corpus_id": corpus_id,
                         "batch_file": str(batch_file),
                         "line_number": line_number,
-                        "error": str(e),
+                        "error": error,
                     }
                 )
+                continue
+
+            if records is not None:
+                records.append({"corpus_id": corpus_id, "text": sectioned_text})
+            else:
+                _write_json(output_file, sectioned_text, pretty)
+
+            successes += 1
+
+        except Exception as e:
+            corpus_id = f"{batch_file.stem}_line_{line_number}"
+            failures.append(
+                {
+                    "corpus_id": corpus_id,
+                    "batch_file": str(batch_file),
+                    "line_number": line_number,
+                    "error": str(e),
+                }
+            )
 
     return {
         "batch_file": str(batch_file),
-        "successes": batch_successes,
-        "failures": batch_failures,
+        "successes": successes,
+        "failures": failures,
         "skipped_existing": skipped_existing,
     }
 
 
-def _sectionize_batches_parallel(batch_files, output_dir: Path, progress: Progress):
-    checkpoint_path = output_dir / "batch_checkpoint.json"
+def _sectionize_batch_file(
+    batch_file: Path,
+    output_dir: Path,
+    shard_path: Path | None = None,
+    language=DEFAULT_LANGUAGE_BACKEND,
+    language_mode="section",
+    vocabulary=DEFAULT_SECTION_VOCABULARY,
+    block: dict | None = None,
+    done_line: int = 0,
+    pretty: bool = False,
+    references: _ReferenceHeuristic | None = None,
+    skip_existing: bool = False,
+):
+    """Sectionize the documents of a ``.jsonl.gz`` batch.
+
+    ``block`` selects part of the batch, as keyword arguments to ``_iter_gzip_lines``;
+    by default every line is read. Lines up to ``done_line`` were completed by an earlier
+    run and are skipped without being parsed. Without ``shard_path``, one JSON file is
+    written per corpus_id, indented if ``pretty``; existing files are skipped if
+    ``skip_existing`` and otherwise overwritten, e.g. those left by an interrupted block.
+    With ``shard_path``, the selected documents are written to that shard in one go.
+    """
+    records = [] if shard_path is not None else None
+    last_line = 0
+
+    def numbered_lines():
+        nonlocal last_line
+        for n, line in _iter_gzip_lines(batch_file, **(block or {})):
+            last_line = n
+            if n > done_line and line.strip():
+                yield n, line
+
+    result = _sectionize_docs(
+        numbered_lines(),
+        batch_file,
+        output_dir,
+        records,
+        language,
+        language_mode,
+        vocabulary,
+        skip_existing=skip_existing,
+        pretty=pretty,
+        references=references,
+    )
+
+    if records:
+        _write_shard(shard_path, records)
+
+    result["corpus_ids"] = [i["corpus_id"] for i in records or []]
+    result["last_line"] = last_line
+    return result
+
+
+def _plan_batch_tasks(batch_files, n_workers: int, done_lines=None) -> list[tuple[Path, int, int, dict]]:
+    """Split batch files into ``(batch_file, part, n_parts, block)`` tasks for the workers.
+
+    Batches with a block index get one task per indexed block, leaving out blocks that end
+    at or before the batch's line in ``done_lines``, so a resumed batch starts by seeking to
+    its first unfinished block. Other batches larger than BYTES_PER_TASK are split into
+    interleaved line ranges, one per share of BYTES_PER_TASK and at most ``n_workers``; each
+    such task still decompresses the whole batch, but only sectionizes its own lines.
+    Parts keep their numbers when earlier ones are left out.
+    """
+    done_lines = done_lines or {}
+    tasks = []
+    for batch_file in batch_files:
+        index = _read_batch_index(batch_file)
+        done_line = done_lines.get(str(batch_file), 0)
+        if index:
+            blocks = [{"offset": offset, "first_line": first, "n_lines": n} for offset, first, n in index]
+        else:
+            n_parts = max(1, min(n_workers, batch_file.stat().st_size // BYTES_PER_TASK))
+            blocks = [{"stride": n_parts, "phase": phase} for phase in range(n_parts)]
+        tasks.extend(
+            (batch_file, part, len(blocks), block)
+            for part, block in enumerate(blocks)
+            if "n_lines" not in block or block["first_line"] + block["n_lines"] - 1 > done_line
+        )
+    return tasks
+
+
+def _part_shard_name(shard_name: str, part: int, n_parts: int) -> str:
+    if n_parts == 1:
+        return shard_name
+    return shard_name.removesuffix(".jsonl.gz") + f".part{part:04d}.jsonl.gz"
+
+
+def _sectionize_page(
+    docs: list,
+    batch_file: Path,
+    first_line: int,
+    output_dir: Path,
+    closes_batch: bool,
+    language=DEFAULT_LANGUAGE_BACKEND,
+    language_mode="section",
+    vocabulary=DEFAULT_SECTION_VOCABULARY,
+    pretty=False,
+    references=None,
+):
+    result = _sectionize_docs(
+        enumerate(docs, start=first_line),
+        batch_file,
+        output_dir,
+        None,
+        language,
+        language_mode,
+        vocabulary,
+        pretty=pretty,
+        references=references,
+    )
+    result["documents"] = len(docs)
+    result["last_line"] = first_line + len(docs) - 1
+    result["closes_batch"] = closes_batch
+    return result
+
+
+class _StreamingSectionizer:
+    """Sectionize documents while a download is still producing them.
+
+    Pages of documents are queued with ``submit`` and sectionized by joblib workers in
+    submission order, writing one ``<corpus_id>.json`` per document into ``output_dir``
+    exactly as section-dataset-v2 would with the same options. Each page records the batch
+    file and line its documents are written to, and once processed its last line becomes
+    the batch's progress, saved to ``output_dir/streaming_checkpoint.json`` every
+    CHECKPOINT_INTERVAL. When the last page of a batch file has been processed, that file is
+    marked complete.
+
+    This progress is kept apart from section-dataset-v2's ``batch_checkpoint.json``, so a
+    later section-dataset-v2 run still reads every batch, only skipping documents whose
+    output already exists.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        progress: Progress,
+        max_pending_pages: int = 64,
+        language=DEFAULT_LANGUAGE_BACKEND,
+        language_mode="section",
+        vocabulary=DEFAULT_SECTION_VOCABULARY,
+        pretty=False,
+        references=None,
+    ):
+        check_backend(language)
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(exist_ok=True, parents=True)
+        self.progress = progress
+        self.task = progress.add_task("[green]Sectionizing", total=None)
+
+        self.successes = 0
+        self.skipped_existing = 0
+        self.error = None
+        self._input_done = False
+
+        self._options = (language, language_mode, vocabulary, pretty, references)
+        self._checkpoint_path = self.output_dir / "streaming_checkpoint.json"
+        self._checkpoint_data = _load_batch_checkpoint(self._checkpoint_path)
+        self._last_write = time.monotonic()
+        self._queue = queue.Queue(maxsize=max_pending_pages)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, batch_file: Path, first_line: int, docs: list, closes_batch: bool = False):
+        """Queue ``docs``, which start at line ``first_line`` of ``batch_file``. Blocks while the queue is full."""
+        self._queue.put((batch_file, first_line, docs, closes_batch))
+
+    def _pages(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._input_done = True
+                return
+            yield item
+
+    def _run(self):
+        try:
+            results = Parallel(n_jobs=-1, return_as="generator")(
+                delayed(_sectionize_page)(docs, batch_file, first_line, self.output_dir, closes_batch, *self._options)
+                for batch_file, first_line, docs, closes_batch in self._pages()
+            )
+            for result in results:
+                self.successes += result["successes"]
+                self.skipped_existing += result["skipped_existing"]
+                _record_batch_progress(
+                    self._checkpoint_data, result["batch_file"], result["last_line"], result["failures"]
+                )
+                if result["closes_batch"]:
+                    self._checkpoint_data["completed_batches"].append(result["batch_file"])
+                if result["closes_batch"] or time.monotonic() - self._last_write >= CHECKPOINT_INTERVAL:
+                    _write_batch_checkpoint(self._checkpoint_path, self._checkpoint_data)
+                    self._last_write = time.monotonic()
+                self.progress.update(self.task, advance=result["documents"])
+        except Exception as e:
+            self.error = e
+            # keep draining so producers never block on a full queue
+            if not self._input_done:
+                for _ in self._pages():
+                    pass
+
+    def close(self):
+        """Wait for every queued page, then save the checkpoint. Raises the first worker error, if any."""
+        self._queue.put(None)
+        self._thread.join()
+        _write_batch_checkpoint(self._checkpoint_path, self._checkpoint_data)
+        if self.error is not None:
+            raise self.error
+
+        self.progress.log("\n* Sectionization:")
+        self.progress.log("* Documents written: " + str(self.successes))
+        self.progress.log("* Existing outputs skipped: " + str(self.skipped_existing))
+        self.progress.log("* Failures: " + str(len(self._checkpoint_data["failures"])))
+
+
+def _sectionize_batches_parallel(
+    batch_files,
+    output_dir: Path,
+    progress: Progress,
+    source: Path | None = None,
+    output_format: str = "json",
+    language=DEFAULT_LANGUAGE_BACKEND,
+    language_mode="section",
+    vocabulary=DEFAULT_SECTION_VOCABULARY,
+    pretty=False,
+    references=None,
+):
+    # Each output format keeps its own progress, so that a run in one format never skips
+    # batches that were only written in the other
+    if output_format == "jsonl.gz":
+        checkpoint_path = output_dir / SHARD_DIR / "batch_checkpoint.json"
+        checkpoint_path.parent.mkdir(exist_ok=True, parents=True)
+    else:
+        checkpoint_path = output_dir / "batch_checkpoint.json"
     checkpoint_data = _load_batch_checkpoint(checkpoint_path)
     completed_batches = set(checkpoint_data.get("completed_batches", []))
 
@@ -397,41 +892,116 @@ def _sectionize_batches_parallel(batch_files, output_dir: Path, progress: Progre
         progress.log("\n* Sectionization:")
         progress.log("* Batch files completed: " + str(len(completed_batches)))
         progress.log("* Documents written: 0")
-        progress.log("* Existing outputs skipped: 0")
         progress.log("* Failures: " + str(len(checkpoint_data.get("failures", []))))
         return
 
+    # Batches are split into blocks so that a few large batches still use every core,
+    # and interrupted batches resume after their last completed line. A shard holds a
+    # whole block, and shard-mode progress is only recorded once a block's shard is
+    # written, so there its lines fall on block ends and only skip finished blocks.
+    done_lines = {k: v["line"] for k, v in checkpoint_data.get("batch_progress", {}).items()}
+    tasks = _plan_batch_tasks(files_to_process, cpu_count(), done_lines)
+    if output_format == "jsonl.gz":
+        done_lines = {}
+
+    # The checkpoint only knows which lines are done for indexed blocks of batches it has
+    # progress for. Other tasks, interleaved parts or batches sectionized without this
+    # checkpoint, still skip the outputs that exist, as a per-document stat is far cheaper
+    # than sectionizing the document again.
+    skip_existing = [
+        "n_lines" not in block or str(bf) not in checkpoint_data.get("batch_progress", {}) for bf, _, _, block in tasks
+    ]
+
+    if output_format == "jsonl.gz":
+        shard_dir = output_dir / SHARD_DIR
+        shard_paths = [
+            shard_dir / _part_shard_name(_shard_name(bf, Path(source or bf.parent)), part, n_parts)
+            for bf, part, n_parts, _ in tasks
+        ]
+    else:
+        shard_paths = [None] * len(tasks)
+
     results = Parallel(n_jobs=-1, return_as="generator")(
-        delayed(_sectionize_batch_file)(batch_file, output_dir) for batch_file in files_to_process
+        delayed(_sectionize_batch_file)(
+            batch_file,
+            output_dir,
+            shard_path,
+            language,
+            language_mode,
+            vocabulary,
+            block,
+            done_lines.get(str(batch_file), 0),
+            pretty,
+            references,
+            task_skips_existing,
+        )
+        for (batch_file, _, _, block), shard_path, task_skips_existing in zip(tasks, shard_paths, skip_existing)
     )
 
     success_count = 0
-    skipped_existing_count = 0
+    parts_remaining = Counter(str(bf) for bf, _, _, _ in tasks)
+    pending_parts = defaultdict(list)
+    last_write = time.monotonic()
 
-    for result in results:
+    for (_, _, _, block), result, shard_path in zip(tasks, results, shard_paths):
+        batch_file = result["batch_file"]
         success_count += result["successes"]
-        skipped_existing_count += result["skipped_existing"]
+        if shard_path is not None and result["corpus_ids"]:
+            _append_shard_index(output_dir, result["corpus_ids"], shard_path.name)
 
         for failure in result["failures"]:
-            checkpoint_data["failures"].append(failure)
             progress.log(
                 f"* Error on corpus_id={failure['corpus_id']} "
                 f"(batch={Path(failure['batch_file']).name}, line={failure['line_number']}): "
                 f"{failure['error']}"
             )
 
-        checkpoint_data["completed_batches"].append(result["batch_file"])
-        _write_batch_checkpoint(checkpoint_path, checkpoint_data)
-        progress.update(task, advance=1)
+        # Results arrive in task order, so an indexed block completes every line up to its
+        # end. Interleaved parts only do so together, once the last of them is done.
+        parts_remaining[batch_file] -= 1
+        if block.get("stride", 1) == 1:
+            _record_batch_progress(checkpoint_data, batch_file, result["last_line"], result["failures"])
+        else:
+            pending_parts[batch_file].append(result)
+            if parts_remaining[batch_file] == 0:
+                parts = pending_parts.pop(batch_file)
+                last_line = max(i["last_line"] for i in parts)
+                _record_batch_progress(
+                    checkpoint_data, batch_file, last_line, [j for i in parts for j in i["failures"]]
+                )
+
+        # The checkpoint, failures and all, is rewritten as a whole, so blocks are only saved
+        # every CHECKPOINT_INTERVAL; blocks finished since are redone after an interruption.
+        if parts_remaining[batch_file] == 0:
+            checkpoint_data["completed_batches"].append(batch_file)
+            progress.update(task, advance=1)
+            _write_batch_checkpoint(checkpoint_path, checkpoint_data)
+            last_write = time.monotonic()
+        elif block.get("stride", 1) == 1 and time.monotonic() - last_write >= CHECKPOINT_INTERVAL:
+            _write_batch_checkpoint(checkpoint_path, checkpoint_data)
+            last_write = time.monotonic()
+
+    _write_batch_checkpoint(checkpoint_path, checkpoint_data)
 
     progress.log("\n* Sectionization:")
     progress.log("* Batch files completed: " + str(len(checkpoint_data["completed_batches"])))
     progress.log("* Documents written: " + str(success_count))
-    progress.log("* Existing outputs skipped: " + str(skipped_existing_count))
     progress.log("* Failures: " + str(len(checkpoint_data["failures"])))
 
 
-def _sectionize_workflow(source: Path, progress: Progress, v2: bool = False):
+def _sectionize_workflow(
+    source: Path,
+    progress: Progress,
+    v2: bool = False,
+    output_format: str = "json",
+    language=DEFAULT_LANGUAGE_BACKEND,
+    language_mode="section",
+    vocabulary=DEFAULT_SECTION_VOCABULARY,
+    pretty=False,
+    references=None,
+):
+    check_backend(language)
+
     output_dir = Path(str(source) + "_sectionized")
     output_dir.mkdir(exist_ok=True, parents=True)
 
@@ -443,7 +1013,18 @@ def _sectionize_workflow(source: Path, progress: Progress, v2: bool = False):
     if v2 and batch_files:
         progress.log("* Detected batch input format (.jsonl.gz).")
         progress.log("* Found " + str(len(batch_files)) + " batch files.")
-        _sectionize_batches_parallel(batch_files, output_dir, progress)
+        _sectionize_batches_parallel(
+            batch_files,
+            output_dir,
+            progress,
+            Path(source),
+            output_format,
+            language,
+            language_mode,
+            vocabulary,
+            pretty,
+            references,
+        )
         return
 
     collected_input_files = _collect_from_path(Path(source))
@@ -469,55 +1050,83 @@ def _sectionize_workflow(source: Path, progress: Progress, v2: bool = False):
         else:
             failed_ids.add(str(failure))
 
+    # Skip by file stem against the existing outputs, without parsing any input here.
+    # Workers repeat both checks by corpus_id once they have read the document, against
+    # the output files or, in shard mode, the shard index.
+    if output_format == "jsonl.gz":
+        existing_stems = set(_load_shard_index(output_dir))
+    else:
+        existing_stems = {i.stem for i in output_dir.iterdir() if i.suffix == ".json"}
+
     files_to_process = []
     skipped_existing_count = 0
     skipped_previous_failures = 0
 
     for i in collected_input_files:
-        try:
-            with open(i, "r") as f:
-                doc = json.load(f)
-            item = _extract_item_from_doc(doc)
-            corpus_id = _get_corpus_id(item, fallback_stem=i.stem)
-        except Exception:
-            corpus_id = i.stem
-
-        output_file = output_dir / Path(corpus_id + ".json")
-        if output_file.exists():
+        if i.stem in existing_stems:
             skipped_existing_count += 1
             progress.update(task, advance=1)
-            continue
-
-        if corpus_id in failed_ids or i.stem in failed_ids:
+        elif i.stem in failed_ids:
             skipped_previous_failures += 1
             progress.update(task, advance=1)
-            continue
-
-        files_to_process.append(i)
-
-    results = Parallel(n_jobs=-1, return_as="generator")(
-        delayed(_sectionize_one_file)(i, output_dir) for i in files_to_process
+        else:
+            files_to_process.append(i)
+
+    file_batches = [
+        files_to_process[i : i + FILES_PER_TASK] for i in range(0, len(files_to_process), FILES_PER_TASK)  # noqa
+    ]
+    if output_format == "jsonl.gz":
+        # Continue numbering after the shards written by earlier runs.
+        shard_dir = output_dir / SHARD_DIR
+        first_shard = len(list(shard_dir.glob("docs_*.jsonl.gz")))
+        shard_paths = [shard_dir / f"docs_{first_shard + i:06d}.jsonl.gz" for i in range(len(file_batches))]
+    else:
+        shard_paths = [None] * len(file_batches)
+
+    failed_ids = frozenset(failed_ids)
+    sharded_ids = frozenset(existing_stems) if output_format == "jsonl.gz" else frozenset()
+    batch_results = Parallel(n_jobs=-1, return_as="generator")(
+        delayed(_sectionize_file_batch)(
+            batch,
+            output_dir,
+            failed_ids,
+            shard_path,
+            language,
+            language_mode,
+            vocabulary,
+            pretty,
+            references,
+            sharded_ids,
+        )
+        for batch, shard_path in zip(file_batches, shard_paths)
     )
 
     success_count = 0
     fail_count = 0
 
-    for success, corpus_id, error, status in results:
-        progress.update(task, advance=1)
-        if success and status == "written":
-            success_count += 1
-        elif success and status == "skipped_existing":
-            skipped_existing_count += 1
-        else:
-            fail_count += 1
-            failure_record = {
-                "corpus_id": corpus_id,
-                "batch_file": None,
-                "line_number": None,
-                "error": error,
-            }
-            failures.append(failure_record)
-            progress.log(f"* Error on: {corpus_id}: {error}")
+    for results, shard_path in zip(batch_results, shard_paths):
+        if shard_path is not None:
+            written = [corpus_id for success, corpus_id, _, status in results if success and status == "written"]
+            if written:
+                _append_shard_index(output_dir, written, shard_path.name)
+        for success, corpus_id, error, status in results:
+            progress.update(task, advance=1)
+            if success and status == "written":
+                success_count += 1
+            elif success and status == "skipped_existing":
+                skipped_existing_count += 1
+            elif success and status == "skipped_failure":
+                skipped_previous_failures += 1
+            else:
+                fail_count += 1
+                failure_record = {
+                    "corpus_id": corpus_id,
+                    "batch_file": None,
+                    "line_number": None,
+                    "error": error,
+                }
+                failures.append(failure_record)
+                progress.log(f"* Error on: {corpus_id}: {error}")
 
     if failures:
         with open(failures_json, "w") as f:
@@ -533,32 +1142,151 @@ def _sectionize_workflow(source: Path, progress: Progress, v2: bool = False):
 @click.command()
 @click.argument("source", nargs=1)
 @click.option("--dump_rejected", "rejected", is_flag=True, default=False)
-def section_dataset(source: Path, rejected: bool = False):
+@click.option(
+    "--output_format",
+    type=click.Choice(OUTPUT_FORMATS),
+    default="json",
+    help="One JSON file per document, or gzipped JSONL shards plus an ID->shard index.",
+)
+@click.option(
+    "--language_backend",
+    type=click.Choice(LANGUAGE_BACKENDS),
+    default=DEFAULT_LANGUAGE_BACKEND,
+    help="How English text is detected. fasttext needs $CLIMPDF_FASTTEXT_MODEL.",
+)
+@click.option(
+    "--language_mode",
+    type=click.Choice(LANGUAGE_MODES),
+    default="section",
+    help="Detect the language of every section, or once per document on a sample of its text.",
+)
+@click.option(
+    "--sections_file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON file overriding the section-name lists that decide which sections are kept.",
+)
+@click.option(
+    "--pretty",
+    is_flag=True,
+    default=False,
+    help="Indent per-document JSON output, for debugging. Output is compact by default.",
+)
+def section_dataset(
+    source: Path,
+    rejected: bool = False,
+    output_format: str = "json",
+    language_backend: str = DEFAULT_LANGUAGE_BACKEND,
+    language_mode: str = "section",
+    sections_file: str = None,
+    pretty: bool = False,
+):
     """Preprocess full-text files in s2orc/pes2o format into headers and subsections.
 
     NOTE: Each file is assumed to contain one result.
     """
+    vocabulary = _SectionVocabulary.from_file(sections_file) if sections_file else DEFAULT_SECTION_VOCABULARY
     with Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn()) as progress:
-        _sectionize_workflow(source, progress, False)
+        _sectionize_workflow(
+            source, progress, False, output_format, language_backend, language_mode, vocabulary, pretty
+        )
+
+
+def _sectionize_options(sections_file: str | None = None, split_refs: bool = False, ref_weights: str | None = None):
+    """Load the ``(vocabulary, references)`` that sectionizing options select."""
+    vocabulary = _SectionVocabulary.from_file(sections_file) if sections_file else DEFAULT_SECTION_VOCABULARY
+    if ref_weights and not split_refs:
+        raise click.UsageError("--ref_weights is only used with --split_refs")
+    references = None
+    if split_refs:
+        references = _ReferenceHeuristic.from_file(ref_weights) if ref_weights else DEFAULT_REFERENCE_HEURISTIC
+    return vocabulary, references
 
 
 @click.command()
 @click.argument("source", nargs=1)
 @click.option("--dump_rejected", "rejected", is_flag=True, default=False)
-def section_dataset_v2(source: Path, rejected: bool = False):
+@click.option(
+    "--output_format",
+    type=click.Choice(OUTPUT_FORMATS),
+    default="json",
+    help="One JSON file per document, or gzipped JSONL shards plus an ID->shard index.",
+)
+@click.option(
+    "--language_backend",
+    type=click.Choice(LANGUAGE_BACKENDS),
+    default=DEFAULT_LANGUAGE_BACKEND,
+    help="How English text is detected. fasttext needs $CLIMPDF_FASTTEXT_MODEL.",
+)
+@click.option(
+    "--language_mode",
+    type=click.Choice(LANGUAGE_MODES),
+    default="section",
+    help="Detect the language of every section, or once per document on a sample of its text.",
+)
+@click.option(
+    "--sections_file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON file overriding the section-name lists that decide which sections are kept.",
+)
+@click.option(
+    "--pretty",
+    is_flag=True,
+    default=False,
+    help="Indent per-document JSON output, for debugging. Output is compact by default.",
+)
+@click.option(
+    "--split_refs",
+    is_flag=True,
+    default=False,
+    help="Split references out of the last section into a References entry, as extract-refs does.",
+)
+@click.option(
+    "--ref_weights",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Weights file from develop_ref_heuristic.py for --split_refs, instead of the default heuristic.",
+)
+def section_dataset_v2(
+    source: Path,
+    rejected: bool = False,
+    output_format: str = "json",
+    language_backend: str = DEFAULT_LANGUAGE_BACKEND,
+    language_mode: str = "section",
+    sections_file: str = None,
+    pretty: bool = False,
+    split_refs: bool = False,
+    ref_weights: str = None,
+):
     """Preprocess full-text files into header:paragraph JSON dictionaries.
 
     Supports both:
     1. Legacy per-document JSON files under the provided source directory.
-    2. Batched JSONL.GZ output from _complete_all_terms_cursor, discovered at:
+    2. Batched JSONL.GZ output from get-from-titanv, discovered at:
        source/all_terms/batches/*.jsonl.gz
+       source/ids/batches/*.jsonl.gz
 
     For batch input:
     - each gzip file is streamed line-by-line
     - each line is treated as one document
     - one sectionized JSON is written per corpus_id
-    - processing resumes at the batch-file level via batch_checkpoint.json
-    - existing output files are skipped
+    - progress is saved to batch_checkpoint.json as the last completed line of each batch,
+      plus a bitmap of its failed lines; a rerun skips completed batches and resumes others
+      at the first unfinished block, without checking for existing output files
+    - large batches are split across workers, by the blocks listed in their .idx
+      sidecar when present, or else by interleaved lines
+
+    With --output_format jsonl.gz, each input batch is instead written to one shard,
+    <source>_sectionized/shards/<batch>.jsonl.gz, holding {"corpus_id", "text"} records.
+    shard_index.tsv maps each corpus_id to its shard. Legacy per-document inputs are
+    grouped into docs_XXXXXX.jsonl.gz shards. extract-refs and the metadata commands
+    read these shards directly. Shard-mode progress is kept apart from per-document
+    progress, in shards/batch_checkpoint.json.
+
+    With --split_refs, references are split out of the last section of each document
+    before it is written, into a "References" entry, using the weights file given by
+    --ref_weights if any. extract-refs is then only needed to re-split with new weights.
 
     The v2 input structure is assumed to contain:
     - "abstract"
@@ -570,5 +1298,16 @@ def section_dataset_v2(source: Path, rejected: bool = False):
 
     NOTE: Each file or JSONL line is assumed to contain one result.
     """
+    vocabulary, references = _sectionize_options(sections_file, split_refs, ref_weights)
     with Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn()) as progress:
-        _sectionize_workflow(source, progress, True)
+        _sectionize_workflow(
+            source,
+            progress,
+            True,
+            output_format,
+            language_backend,
+            language_mode,
+            vocabulary,
+            pretty,
+            references,
+        )
@@ -1,41 +1,287 @@
 import asyncio
 import csv
-import gzip
 import json
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import click
-from ratelimit import limits, sleep_and_retry
+import httpx
 from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn
 
+from climpdfgetter.language import DEFAULT_LANGUAGE_BACKEND, LANGUAGE_BACKENDS, LANGUAGE_MODES
 from climpdfgetter.searches import q
-from climpdfgetter.utils import _build_session, _prep_output_dir
-
-SINGLE_CORPUS_ID_REQUESTS_QUERY = (
-    "http://titanv.gss.anl.gov:8983/solr/s2orc_corpus/select?df=corpus_id&" + "indent=true&q.op=OR&q={}&useParams="
+from climpdfgetter.sectionize import _sectionize_options, _StreamingSectionizer
+from climpdfgetter.utils import (
+    _append_gzip_blocks,
+    _AsyncTokenBucket,
+    _build_session,
+    _CheckpointLog,
+    _prep_output_dir,
 )
 
-
 TITANV_SELECT_URL = "http://titanv.gss.anl.gov:8983/solr/s2orc_corpus/select"
 
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Only the fields read by section_dataset_v2 are requested by default.
+DEFAULT_FIELDS = ("corpus_id", "title", "abstract", "paragraph", "sectionheader")
+
+
+def _cursor_params(cursor_mark: str, rows: int, fq: str | None = None, fields=DEFAULT_FIELDS) -> dict:
+    params = {
+        "df": "paragraph",
+        "q.op": "OR",
+        "q": q,
+        "rows": rows,
+        "sort": "id asc",  # replace if needed with true unique sort field
+        "cursorMark": cursor_mark,
+        "fl": ",".join(fields),
+        "wt": "json",
+        "useParams": "",
+    }
+    if fq is not None:
+        params["fq"] = fq
+    return params
+
+
+def _corpus_id_params(corpus_id, fields=DEFAULT_FIELDS) -> dict:
+    return {
+        "df": "corpus_id",
+        "q.op": "OR",
+        "q": corpus_id,
+        "fl": ",".join(fields),
+        "wt": "json",
+        "useParams": "",
+    }
+
+
+def _corpus_id_batch_params(corpus_ids: list[str], start: int, fields=DEFAULT_FIELDS) -> dict:
+    return {
+        "q": "{!terms f=corpus_id}" + ",".join(corpus_ids),
+        "rows": len(corpus_ids),
+        "start": start,
+        "sort": "id asc",
+        "fl": ",".join(fields),
+        "wt": "json",
+    }
+
+
+def _parse_fields(fields: str) -> tuple[str, ...]:
+    return tuple(i.strip() for i in fields.split(",") if i.strip()) or ("*",)
+
+
+def _get_shard_filters(payload: dict, n_shards: int) -> list[str | None]:
+    """Split the corpus_id range reported by the stats component into disjoint filter queries.
+
+    Documents without a corpus_id get a filter of their own. Without a corpus_id range, e.g.
+    when nothing matched, the only filter is ``None``: a single unsharded cursor.
+    """
+    stats = payload.get("stats", {}).get("stats_fields", {}).get("corpus_id") or {}
+    if stats.get("min") is None or stats.get("max") is None:
+        return [None]
+    low, high = int(stats["min"]), int(stats["max"])
+    step = max(1, -(-(high - low + 1) // n_shards))
+
+    filters = []
+    for shard in range(n_shards):
+        start = low + shard * step
+        if start > high:
+            break
+        if shard == n_shards - 1 or start + step > high:
+            filters.append(f"corpus_id:[{start} TO *]")
+            break
+        filters.append(f"corpus_id:[{start} TO {start + step}}}")
+    if stats.get("missing", 1):
+        filters.append("-corpus_id:[* TO *]")
+    return filters
+
+
+def _write_batch(batch_path: Path, docs: list, ids: list, ids_path: Path, ids_lock: threading.Lock):
+    # Block-indexed, so section-dataset-v2 can spread one batch across workers
+    _append_gzip_blocks(batch_path, [json.dumps(doc) for doc in docs])
+
+    with ids_lock:
+        with ids_path.open("a", encoding="utf-8") as f:
+            for corpus_id in ids:
+                f.write(corpus_id)
+                f.write("\n")
+
+
+def _batch_writer(
+    write_queue: queue.Queue,
+    batch_dir: Path,
+    ids_path: Path,
+    ids_lock: threading.Lock,
+    save_state,
+    failed: threading.Event,
+):
+    """
+    Consume ``(batch_name, docs, ids, state)`` items from ``write_queue`` until a ``None``
+    sentinel arrives. Each batch is compressed and written before its ``state`` snapshot is
+    saved, so a checkpoint never points past data that is not on disk.
+
+    Returns the first exception raised while writing, if any, and sets ``failed``. After an
+    error, remaining items are drained without writing so the producer never blocks on a full queue.
+    """
+    error = None
+    while True:
+        item = write_queue.get()
+        if item is None:
+            return error
+        if error is not None:
+            continue
+        batch_name, docs, ids, state = item
+        try:
+            if docs:
+                _write_batch(batch_dir / batch_name, docs, ids, ids_path, ids_lock)
+            save_state(state)
+        except Exception as e:
+            error = e
+            failed.set()
+
+
+def _walk_cursor(
+    state: dict,
+    fq: str | None,
+    batch_name,
+    batch_dir: Path,
+    ids_path: Path,
+    ids_lock: threading.Lock,
+    save_state,
+    progress,
+    task,
+    rows: int,
+    flush_every_pages: int,
+    max_pending_batches: int = 2,
+    fields=DEFAULT_FIELDS,
+    sectionizer: _StreamingSectionizer | None = None,
+):
+    """
+    Walk a single Solr cursor to exhaustion, flushing a batch file and saving a snapshot of
+    ``state`` every ``flush_every_pages`` pages. ``state`` holds the cursor_mark, page_index,
+    batch_index and total_downloaded of this cursor.
+
+    Fetching runs in the calling thread; compression, writing and checkpointing run in a
+    writer thread fed through a queue holding at most ``max_pending_batches`` batches, so
+    network requests continue while a batch is being gzipped.
+
+    With a ``sectionizer``, every page is also handed to it as soon as it is fetched, along
+    with the batch file and line its documents will be written to.
+    """
+    session = _build_session()
+    cursor_mark = state["cursor_mark"]
+
+    pending_docs = []
+    pending_ids = []
+
+    write_queue = queue.Queue(maxsize=max_pending_batches)
+    writer_failed = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        writer_future = writer.submit(
+            _batch_writer, write_queue, batch_dir, ids_path, ids_lock, save_state, writer_failed
+        )
+
+        while not writer_failed.is_set():
+            try:
+                r = session.get(TITANV_SELECT_URL, params=_cursor_params(cursor_mark, rows, fq, fields), timeout=120)
+                r.raise_for_status()
+                payload = r.json()
+            except Exception as e:
+                progress.log(f"* Error fetching cursor page {state['page_index']} ({fq or 'all'}): {e}")
+                time.sleep(5)
+                continue
+
+            response = payload["response"]
+            docs = response["docs"]
+            next_cursor_mark = payload.get("nextCursorMark", cursor_mark)
+
+            if not docs:
+                progress.log(f"* No more docs returned ({fq or 'all'}); stopping.")
+                break
+
+            first_line = len(pending_docs) + 1
+            pending_docs.extend(docs)
+            pending_ids.extend(str(doc["corpus_id"][0]) for doc in docs if "corpus_id" in doc)
+
+            state["page_index"] += 1
+            state["total_downloaded"] += len(docs)
+            progress.update(task, advance=len(docs))
+
+            should_flush = state["page_index"] % flush_every_pages == 0
+
+            if sectionizer is not None:
+                sectionizer.submit(batch_dir / batch_name(state["batch_index"] + 1), first_line, docs, should_flush)
+
+            if should_flush:
+                state["batch_index"] += 1
+                state["cursor_mark"] = next_cursor_mark
+                write_queue.put((batch_name(state["batch_index"]), pending_docs, pending_ids, dict(state)))
+
+                pending_docs = []
+                pending_ids = []
+
+            if next_cursor_mark == cursor_mark:
+                progress.log(f"* Cursor did not advance ({fq or 'all'}); finished.")
+                break
+
+            cursor_mark = next_cursor_mark
+
+        # Final flush
+        if pending_docs:
+            state["batch_index"] += 1
+            if sectionizer is not None:
+                sectionizer.submit(batch_dir / batch_name(state["batch_index"]), len(pending_docs) + 1, [], True)
+        state["cursor_mark"] = cursor_mark
+        state["complete"] = True
+        write_queue.put((batch_name(state["batch_index"]), pending_docs, pending_ids, dict(state)))
+        write_queue.put(None)
+
+        writer_error = writer_future.result()
+
+    if writer_error is not None:
+        raise writer_error
+
+    return state["total_downloaded"]
+
 
 def _complete_all_terms_cursor(
     output_dir: Path,
     progress,
     rows: int = 1000,
     flush_every_pages: int = 25,
+    n_shards: int = 1,
+    fields=DEFAULT_FIELDS,
+    sectionize: bool = False,
+    sectionize_options: dict | None = None,
 ):
     """
     Download all matching Solr documents using cursor-based pagination and write them
     to compressed JSONL batches.
 
+    With ``sectionize``, documents are also sectionized as pages arrive, into
+    ``<output_dir>_sectionized`` as section-dataset-v2 would lay them out.
+    ``sectionize_options`` are keyword arguments for the ``_StreamingSectionizer``.
+
+    With ``n_shards > 1`` the query is split into disjoint ``corpus_id`` ranges, and one
+    cursor per range is walked concurrently, plus one for documents without a corpus_id. If
+    the stats report no range, e.g. nothing matched, the download runs unsharded. Each
+    shard's progress is kept under ``checkpoint.json["shards"]``, so an interrupted sharded
+    run resumes every shard independently. The shard ranges are fixed by the first run of a
+    given output directory.
+
+    Only ``fields`` are returned for each document, and responses are unindented JSON.
+
     Output layout:
       output_dir/
         all_terms/
           batches/
-            batch_000001.jsonl.gz
-            batch_000002.jsonl.gz
+            batch_000001.jsonl.gz                (unsharded)
+            batch_000001.jsonl.gz.idx            (block index of the batch above)
+            shard_00_batch_000001.jsonl.gz       (sharded)
             ...
           ids.txt
           checkpoint.json
@@ -52,140 +298,277 @@ def _complete_all_terms_cursor(
     checkpoint_path = subdir / "checkpoint.json"
 
     # Resume support
-    cursor_mark = "*"
-    page_index = 0
-    batch_index = 0
-    total_downloaded = 0
-
+    checkpoint_data = {}
     if checkpoint_path.exists():
         try:
             checkpoint_data = json.loads(checkpoint_path.read_text())
-            cursor_mark = checkpoint_data.get("cursor_mark", "*")
-            page_index = checkpoint_data.get("page_index", 0)
-            batch_index = checkpoint_data.get("batch_index", 0)
-            total_downloaded = checkpoint_data.get("total_downloaded", 0)
-            progress.log(f"* Resuming from checkpoint: {total_downloaded} documents downloaded.")
         except json.JSONDecodeError:
             pass
 
-    # First request: get numFound for progress
-    initial_params = {
-        "df": "paragraph",
-        "indent": "true",
-        "q.op": "OR",
-        "q": q,
-        "rows": rows,
-        "sort": "id asc",  # replace if needed with true unique sort field
-        "cursorMark": cursor_mark,
-        "useParams": "",
-    }
+    if "shards" in checkpoint_data:
+        n_shards = len(checkpoint_data["shards"])
+        progress.log(f"* Resuming sharded checkpoint with {n_shards} shards.")
+    elif "cursor_mark" in checkpoint_data and n_shards > 1:
+        progress.log("* Existing unsharded checkpoint found; resuming unsharded.")
+        n_shards = 1
+
+    # First request: get numFound for progress, and the corpus_id range when sharding
+    initial_params = _cursor_params("*", 0)
+    if n_shards > 1 and "shards" not in checkpoint_data:
+        initial_params["stats"] = "true"
+        initial_params["stats.field"] = "corpus_id"
 
     r = session.get(TITANV_SELECT_URL, params=initial_params, timeout=120)
     r.raise_for_status()
     payload = r.json()
 
     num_found = payload["response"]["numFound"]
-    task = progress.add_task("[white]All Terms: ", total=num_found, completed=total_downloaded)
-
-    pending_docs = []
-    pending_ids = []
+    if n_shards > 1 and "shards" not in checkpoint_data:
+        shard_filters = _get_shard_filters(payload, n_shards)
+        if shard_filters == [None]:
+            progress.log("* No corpus_id range to shard; downloading unsharded.")
+            n_shards = 1
+    ids_lock = threading.Lock()
+    checkpoint_lock = threading.Lock()
+
+    sectionizer = None
+    if sectionize:
+        sectionizer = _StreamingSectionizer(
+            Path(str(output_dir) + "_sectionized"), progress, **(sectionize_options or {})
+        )
+
+    # The sectionizer is closed even if a download fails, so its worker thread stops and
+    # the pages it already processed are saved to its checkpoint
+    try:
+        if n_shards == 1 and "shards" not in checkpoint_data:
+            state = {
+                "cursor_mark": checkpoint_data.get("cursor_mark", "*"),
+                "page_index": checkpoint_data.get("page_index", 0),
+                "batch_index": checkpoint_data.get("batch_index", 0),
+                "total_downloaded": checkpoint_data.get("total_downloaded", 0),
+            }
+            if state["total_downloaded"]:
+                progress.log(f"* Resuming from checkpoint: {state['total_downloaded']} documents downloaded.")
+
+            def _save_state(state):
+                checkpoint_path.write_text(json.dumps({**state, "rows": rows}, indent=2))
+
+            task = progress.add_task("[white]All Terms: ", total=num_found, completed=state["total_downloaded"])
+            total = _walk_cursor(
+                state,
+                None,
+                lambda batch_index: f"batch_{batch_index: 06}.jsonl.gz",
+                batch_dir,
+                ids_path,
+                ids_lock,
+                _save_state,
+                progress,
+                task,
+                rows,
+                flush_every_pages,
+                fields=fields,
+                sectionizer=sectionizer,
+            )
+            return total
+
+        if "shards" not in checkpoint_data:
+            checkpoint_data = {
+                "shards": {
+                    str(shard): {
+                        "fq": fq,
+                        "cursor_mark": "*",
+                        "page_index": 0,
+                        "batch_index": 0,
+                        "total_downloaded": 0,
+                    }
+                    for shard, fq in enumerate(shard_filters)
+                },
+                "rows": rows,
+            }
+            checkpoint_path.write_text(json.dumps(checkpoint_data, indent=2))
 
+        shards = checkpoint_data["shards"]
+        already_downloaded = sum(state["total_downloaded"] for state in shards.values())
+        if already_downloaded:
+            progress.log(f"* Resuming from checkpoint: {already_downloaded} documents downloaded.")
+        task = progress.add_task(
+            f"[white]All Terms ({len(shards)} shards): ", total=num_found, completed=already_downloaded
+        )
+
+        def _save_checkpoint():
+            with checkpoint_lock:
+                checkpoint_path.write_text(json.dumps(checkpoint_data, indent=2))
+
+        def _run_shard(shard):
+            if shards[shard].get("complete"):
+                return shards[shard]["total_downloaded"]
+
+            def _save_shard_state(state):
+                with checkpoint_lock:
+                    shards[shard] = state
+                    checkpoint_path.write_text(json.dumps(checkpoint_data, indent=2))
+
+            state = dict(shards[shard])
+            return _walk_cursor(
+                state,
+                state["fq"],
+                lambda batch_index: f"shard_{int(shard):02d}_batch_{batch_index:06d}.jsonl.gz",
+                batch_dir,
+                ids_path,
+                ids_lock,
+                _save_shard_state,
+                progress,
+                task,
+                rows,
+                flush_every_pages,
+                fields=fields,
+                sectionizer=sectionizer,
+            )
+
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            totals = list(executor.map(_run_shard, shards))
+
+        checkpoint_data["complete"] = True
+        _save_checkpoint()
+
+        return sum(totals)
+    finally:
+        if sectionizer is not None:
+            sectionizer.close()
+
+
+def _fetch_corpus_id_batch(session, corpus_ids: list[str], fields=DEFAULT_FIELDS) -> list[dict]:
+    """Fetch every document matching any of ``corpus_ids`` with a single ``{!terms}`` query, paging if needed."""
+    docs = []
     while True:
-        params = {
-            "df": "paragraph",
-            "indent": "true",
-            "q.op": "OR",
-            "q": q,
-            "rows": rows,
-            "sort": "id asc",  # replace if needed
-            "cursorMark": cursor_mark,
-            "useParams": "",
-        }
+        # POST keeps long ID lists out of the request line
+        r = session.post(TITANV_SELECT_URL, data=_corpus_id_batch_params(corpus_ids, len(docs), fields), timeout=120)
+        r.raise_for_status()
+        response = r.json()["response"]
+        docs.extend(response["docs"])
+        if not response["docs"] or len(docs) >= response["numFound"]:
+            return docs
 
-        try:
-            r = session.get(TITANV_SELECT_URL, params=params, timeout=120)
-            r.raise_for_status()
-            payload = r.json()
-        except Exception as e:
-            progress.log(f"* Error fetching cursor page {page_index}: {e}")
-            time.sleep(5)
-            continue
 
-        response = payload["response"]
-        docs = response["docs"]
-        next_cursor_mark = payload.get("nextCursorMark", cursor_mark)
+def _complete_corpus_ids_batched(
+    corpus_ids: list,
+    output_dir: Path,
+    progress,
+    checkpoint: _CheckpointLog,
+    batch_size: int = 500,
+    fields=DEFAULT_FIELDS,
+):
+    """
+    Look up ``batch_size`` corpus IDs per Solr request and write the returned documents to
+    compressed JSONL batches, in the same format as the "all terms" download.
+
+    Output layout:
+      output_dir/
+        ids/
+          batches/
+            batch_000001.jsonl.gz
+            batch_000001.jsonl.gz.idx
+            ...
+          ids.txt
 
-        if not docs:
-            progress.log("* No more docs returned; stopping.")
-            break
+    Corpus IDs whose lookups succeeded are added to ``checkpoint``. IDs in failed requests
+    are left out so they are retried on the next run.
+    """
+    session = _build_session()
 
-        pending_docs.extend(docs)
-        pending_ids.extend(str(doc["corpus_id"][0]) for doc in docs if "corpus_id" in doc)
+    subdir = output_dir / "ids"
+    subdir.mkdir(exist_ok=True)
 
-        page_index += 1
-        total_downloaded += len(docs)
-        progress.update(task, advance=len(docs))
+    batch_dir = subdir / "batches"
+    batch_dir.mkdir(exist_ok=True)
 
-        should_flush = page_index % flush_every_pages == 0
+    ids_path = subdir / "ids.txt"
+    ids_lock = threading.Lock()
+    batch_index = len(list(batch_dir.glob("batch_*.jsonl.gz")))
 
-        if should_flush:
-            batch_index += 1
-            batch_path = batch_dir / f"batch_{batch_index: 06}.jsonl.gz"
+    task = progress.add_task("[white]Corpus IDs: ", total=len(corpus_ids))
 
-            with gzip.open(batch_path, "at", encoding="utf-8") as f:
-                for doc in pending_docs:
-                    f.write(json.dumps(doc))
-                    f.write("\n")
+    for start in range(0, len(corpus_ids), batch_size):
+        batch = [str(i) for i in corpus_ids[start : start + batch_size]]  # noqa
+        try:
+            docs = _fetch_corpus_id_batch(session, batch, fields)
+        except Exception as e:
+            progress.log(f"\n* Error with corpus ID batch starting at {batch[0]}. Error: {e}")
+            progress.update(task, advance=len(batch))
+            continue
 
-            with ids_path.open("a", encoding="utf-8") as f:
-                for corpus_id in pending_ids:
-                    f.write(corpus_id)
-                    f.write("\n")
+        if docs:
+            batch_index += 1
+            found_ids = [str(doc["corpus_id"][0]) for doc in docs if "corpus_id" in doc]
+            _write_batch(batch_dir / f"batch_{batch_index:06d}.jsonl.gz", docs, found_ids, ids_path, ids_lock)
 
-            checkpoint_data = {
-                "cursor_mark": next_cursor_mark,
-                "page_index": page_index,
-                "batch_index": batch_index,
-                "total_downloaded": total_downloaded,
-                "rows": rows,
-            }
-            checkpoint_path.write_text(json.dumps(checkpoint_data, indent=2))
+        for corpus_id in batch:
+            checkpoint.add(corpus_id)
+        progress.update(task, advance=len(batch))
 
-            pending_docs.clear()
-            pending_ids.clear()
 
-        if next_cursor_mark == cursor_mark:
-            progress.log("* Cursor did not advance; finished.")
-            break
+async def _fetch_corpus_id(
+    client: httpx.AsyncClient, limiter: _AsyncTokenBucket, corpus_id, fields=DEFAULT_FIELDS, retries: int = 5
+) -> dict:
+    for attempt in range(retries):
+        await limiter.acquire()
+        try:
+            r = await client.get(TITANV_SELECT_URL, params=_corpus_id_params(corpus_id, fields))
+        except httpx.TransportError:
+            if attempt == retries - 1:
+                raise
+        else:
+            if r.status_code not in RETRY_STATUSES or attempt == retries - 1:
+                r.raise_for_status()
+                return r.json()
+        await asyncio.sleep(2**attempt)
 
-        cursor_mark = next_cursor_mark
 
-    # Final flush
-    if pending_docs:
-        batch_index += 1
-        batch_path = batch_dir / f"batch_{batch_index: 06}.jsonl.gz"
+async def _complete_corpus_ids_async(
+    corpus_ids: list,
+    output_dir: Path,
+    progress,
+    checkpoint: _CheckpointLog,
+    concurrency: int = 32,
+    rate: float = 180.0,
+    fields=DEFAULT_FIELDS,
+):
+    """
+    Look up corpus IDs one request at a time and write one JSON file per ID found.
 
-        with gzip.open(batch_path, "at", encoding="utf-8") as f:
-            for doc in pending_docs:
-                f.write(json.dumps(doc))
-                f.write("\n")
+    ``concurrency`` workers pull IDs from a shared queue over one pooled HTTP client, and
+    every request first takes a token from a shared ``rate``-per-second bucket. A slow
+    request only holds up its own worker. IDs whose lookups succeeded, found or not, are
+    added to ``checkpoint``. IDs whose requests failed are left out so they are retried on
+    the next run.
+    """
+    id_queue = asyncio.Queue()
+    for corpus_id in corpus_ids:
+        id_queue.put_nowait(corpus_id)
 
-        with ids_path.open("a", encoding="utf-8") as f:
-            for corpus_id in pending_ids:
-                f.write(corpus_id)
-                f.write("\n")
+    limiter = _AsyncTokenBucket(rate)
+    task = progress.add_task("[white]Corpus IDs: ", total=len(corpus_ids))
 
-    checkpoint_data = {
-        "cursor_mark": cursor_mark,
-        "page_index": page_index,
-        "batch_index": batch_index,
-        "total_downloaded": total_downloaded,
-        "rows": rows,
-        "complete": True,
-    }
-    checkpoint_path.write_text(json.dumps(checkpoint_data, indent=2))
+    async def _worker(client):
+        while True:
+            try:
+                corpus_id = id_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                payload = await _fetch_corpus_id(client, limiter, corpus_id, fields)
+                if payload["response"]["numFound"]:
+                    with (output_dir / Path(str(corpus_id) + ".json")).open("w") as f:
+                        json.dump(payload, f)
+            except Exception as e:
+                progress.log(f"\n* Error with {corpus_id}. Error: {e}")
+            else:
+                checkpoint.add(corpus_id)
+            progress.update(task, advance=1)
 
-    return total_downloaded
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*[_worker(client) for _ in range(concurrency)])
 
 
 @click.command()
@@ -199,7 +582,108 @@ def _complete_all_terms_cursor(
     default=None,
     help="Optional existing or new output directory. Reuse existing all-terms directory to resume from checkpoint.",
 )
-def get_from_titanv(source: Path, all_terms: bool, output_dir: Path | None):
+@click.option(
+    "--shards",
+    nargs=1,
+    type=click.IntRange(min=1),
+    default=1,
+    help="Split an all-terms download into this many corpus_id ranges, each fetched by its own concurrent cursor.",
+)
+@click.option(
+    "--fields",
+    "-f",
+    nargs=1,
+    type=str,
+    default=",".join(DEFAULT_FIELDS),
+    show_default=True,
+    help="Comma-separated Solr field list to return for each document. Use '*' for full documents.",
+)
+@click.option(
+    "--batch-size",
+    "-b",
+    nargs=1,
+    type=click.IntRange(min=0),
+    default=0,
+    help="Look up this many corpus IDs per request and write .jsonl.gz batches. 0 requests one ID at a time.",
+)
+@click.option(
+    "--concurrency",
+    "-c",
+    nargs=1,
+    type=click.IntRange(min=1),
+    default=32,
+    show_default=True,
+    help="Maximum number of in-flight requests when looking up one corpus ID at a time.",
+)
+@click.option(
+    "--rate",
+    "-r",
+    nargs=1,
+    type=click.FloatRange(min=0, min_open=True),
+    default=180.0,
+    show_default=True,
+    help="Maximum requests per second when looking up one corpus ID at a time.",
+)
+@click.option(
+    "--sectionize",
+    is_flag=True,
+    default=False,
+    help="With --all-terms, also sectionize documents as they arrive, into <output>_sectionized.",
+)
+# The sectionizing options of section-dataset-v2, under the same names
+@click.option(
+    "--language_backend",
+    type=click.Choice(LANGUAGE_BACKENDS),
+    default=DEFAULT_LANGUAGE_BACKEND,
+    help="With --sectionize, how English text is detected. fasttext needs $CLIMPDF_FASTTEXT_MODEL.",
+)
+@click.option(
+    "--language_mode",
+    type=click.Choice(LANGUAGE_MODES),
+    default="section",
+    help="With --sectionize, detect the language of every section, or once per document.",
+)
+@click.option(
+    "--sections_file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="With --sectionize, JSON file overriding the section-name lists that decide which sections are kept.",
+)
+@click.option(
+    "--pretty",
+    is_flag=True,
+    default=False,
+    help="With --sectionize, indent the sectionized JSON output.",
+)
+@click.option(
+    "--split_refs",
+    is_flag=True,
+    default=False,
+    help="With --sectionize, split references out of the last section into a References entry.",
+)
+@click.option(
+    "--ref_weights",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="With --split_refs, a weights file from develop_ref_heuristic.py instead of the default heuristic.",
+)
+def get_from_titanv(
+    source: Path,
+    all_terms: bool,
+    output_dir: Path | None,
+    shards: int,
+    fields: str,
+    batch_size: int,
+    concurrency: int,
+    rate: float,
+    sectionize: bool,
+    language_backend: str,
+    language_mode: str,
+    sections_file: str | None,
+    pretty: bool,
+    split_refs: bool,
+    ref_weights: str | None,
+):
     """Provide an input dataset containing corpus IDs OR perform an "all terms" search.
 
     Use one of the options, not multiple.
@@ -207,49 +691,28 @@ def get_from_titanv(source: Path, all_terms: bool, output_dir: Path | None):
     Args:
         source (Path): Path to input dataset.
         all_terms (bool): Whether to perform the pre-defined "all terms" search.
+        shards (int): Number of concurrent cursors for the "all terms" search.
+        fields (str): Comma-separated Solr fields to download.
+        batch_size (int): Number of corpus IDs per request for an input dataset. 0 for one file per ID.
+        concurrency (int): Maximum in-flight requests for one-file-per-ID lookups.
+        rate (float): Maximum requests per second for one-file-per-ID lookups.
+        sectionize (bool): Sectionize "all terms" documents while they download.
+        language_backend, language_mode, sections_file, pretty, split_refs, ref_weights:
+            Options for --sectionize, as for section-dataset-v2.
     """
+    fields = _parse_fields(fields)
+    vocabulary, references = _sectionize_options(sections_file, split_refs, ref_weights)
+    sectionize_options = {
+        "language": language_backend,
+        "language_mode": language_mode,
+        "vocabulary": vocabulary,
+        "pretty": pretty,
+        "references": references,
+    }
 
-    session = _build_session()
-
-    @sleep_and_retry
-    @limits(calls=180, period=1)
-    def _do_request(corpus_id):
-        return session.get(SINGLE_CORPUS_ID_REQUESTS_QUERY.format(corpus_id), timeout=5)
-
-    def _complete_semantic_scholar(chunk_idx, data_chunk, output_dir, progress, checkpoint_data, lock, semaphore):
-
-        subdir = output_dir / Path("chunk_" + str(chunk_idx))
-        subdir.mkdir(exist_ok=True)
-
-        color = ["red", "green", "blue", "yellow", "magenta", "cyan"][chunk_idx % 6]
-        task = progress.add_task(f"[{color}]Chunk " + str(chunk_idx) + ": ", total=len(data_chunk))
-
-        for doc in data_chunk:
-            try:
-                corpus_id = doc[6]
-                doc_path = subdir / Path(str(corpus_id) + ".json")
-                r = _do_request(corpus_id)
-                r.raise_for_status()
-                progress.update(task, advance=1)
-                checkpoint_data.append(corpus_id)
-
-                if r.json()["response"]["numFound"] == 0:
-                    continue
-                with doc_path.open("w") as f:
-                    json.dump(r.json(), f)
-
-            except KeyboardInterrupt:
-                progress.log("\n* User interrupted. Exiting.")
-                return checkpoint_data
-            except Exception as e:
-                progress.log(f"\n* Error with {corpus_id}. Error: {e}")
-                progress.update(task, advance=1)
-                checkpoint_data.append(corpus_id)
-                continue
-
-        return checkpoint_data
-
-    async def finish_main(source, all_terms, output_dir=None):
+    async def finish_main(
+        source, all_terms, output_dir=None, shards=1, batch_size=0, concurrency=32, rate=180.0, sectionize=False
+    ):
         if output_dir is not None:
             path = Path(output_dir)
             path.mkdir(parents=True, exist_ok=True)
@@ -258,28 +721,12 @@ def get_from_titanv(source: Path, all_terms: bool, output_dir: Path | None):
         else:
             path = _prep_output_dir("titanv_id_results_v2")
 
-        checkpoint = path.parent / Path("titanv_checkpoint.json")
-        if not checkpoint.exists():
-            checkpoint.touch()
-            checkpoint_data = []
-        else:
-            try:
-                checkpoint_data = checkpoint.read_text()
-                checkpoint_data = json.loads(checkpoint_data)
-            except json.decoder.JSONDecodeError:
-                checkpoint_data = []
-
-        nchunks = 8
-        checkpoint_lock = asyncio.Lock()
-        semaphore = asyncio.Semaphore(nchunks)
-        checkpoint_chunks = []
-
         if source:
             source_path = Path(source)
             if source_path.suffix == ".json":
                 with source_path.open("r") as f:
                     ids = json.load(f)
-                # Convert list of IDs to the format expected by _complete_semantic_scholar (id at index 6)
+                # Convert list of IDs to the CSV row format (id at index 6)
                 data = [[None] * 6 + [cid] for cid in ids]
             else:
                 with open(source, "r") as f:
@@ -289,25 +736,37 @@ def get_from_titanv(source: Path, all_terms: bool, output_dir: Path | None):
             if not data:
                 return
 
-            chunk_size = max(1, len(data) // nchunks)
-            chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]  # noqa
-
-            with Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn()) as progress:
-                checkpoint_chunks = await asyncio.gather(
-                    *[
-                        asyncio.to_thread(
-                            _complete_semantic_scholar,
-                            i,
-                            chunk,
-                            path,
-                            progress,
-                            checkpoint_data,
-                            checkpoint_lock,
-                            semaphore,
-                        )
-                        for i, chunk in enumerate(chunks)
-                    ]
-                )
+            checkpoint = _CheckpointLog(
+                path.parent / Path("titanv_checkpoint.log"), legacy_json=path.parent / Path("titanv_checkpoint.json")
+            )
+            click.echo(f"Loaded {len(checkpoint)} processed IDs from checkpoint.")
+            corpus_ids = [doc[6] for doc in data if doc[6] not in checkpoint]
+
+            with (
+                checkpoint,
+                Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn()) as progress,
+            ):
+                if batch_size:
+                    await asyncio.to_thread(
+                        _complete_corpus_ids_batched,
+                        corpus_ids,
+                        path,
+                        progress,
+                        checkpoint,
+                        batch_size,
+                        fields,
+                    )
+                else:
+                    await _complete_corpus_ids_async(
+                        corpus_ids,
+                        path,
+                        progress,
+                        checkpoint,
+                        concurrency,
+                        rate,
+                        fields,
+                    )
+                progress.log(f"\n* Looked up {len(corpus_ids)} corpus IDs.")
 
         elif all_terms:
             with Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn()) as progress:
@@ -318,15 +777,12 @@ def get_from_titanv(source: Path, all_terms: bool, output_dir: Path | None):
                         progress,
                         200,  # rows
                         50,  # flush_every_pages
+                        shards,
+                        fields,
+                        sectionize,
+                        sectionize_options,
                     )
                 )
                 progress.log(f"\n* Found {sum(totals)} documents.")
-            return
-
-        output_checkpoint_data = []
-        output_checkpoint_data += sum(checkpoint_chunks, [])
-        progress.log(f"\n* Found {len(output_checkpoint_data)} documents.")
-        with checkpoint.open("w") as f:
-            f.write(json.dumps(output_checkpoint_data))
 
-    asyncio.run(finish_main(source, all_terms, output_dir))
+    asyncio.run(finish_main(source, all_terms, output_dir, shards, batch_size, concurrency, rate, sectionize))
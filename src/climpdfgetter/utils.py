@@ -1,6 +1,10 @@
+import asyncio
 import datetime
+import gzip
 import json
+import os
 import re
+import time
 from pathlib import Path
 
 import click
@@ -8,6 +12,11 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # regex from https://www.geeksforgeeks.org/python-check-url-string/ - cant answer any questions about it :)
 URL_RE = r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))"  # noqa
 
@@ -21,7 +30,7 @@ def _build_session() -> requests.Session:
         read=5,
         backoff_factor=1.0,
         status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET"],
+        allowed_methods=["GET", "POST"],  # Solr select requests are idempotent
         raise_on_status=False,
     )
 
@@ -35,6 +44,142 @@ def _build_session() -> requests.Session:
     return session
 
 
+class _AsyncTokenBucket:
+    """Token-bucket rate limiter shared by any number of coroutines.
+
+    Allows bursts of up to ``capacity`` calls, refilled at ``rate`` calls per second.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _CheckpointLog:
+    """Append-only log of completed IDs, one per line, held in memory as a set.
+
+    Lines are flushed and fsynced every ``fsync_every`` additions and on close, so a crash
+    loses at most that many IDs. A torn final line left by a crash is dropped on load.
+    If the log does not exist yet, it is seeded from ``legacy_json``, a JSON list of IDs.
+    """
+
+    def __init__(self, path: Path, fsync_every: int = 1000, legacy_json: Path | None = None):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.completed = set()
+
+        if not self.path.exists() and legacy_json is not None and Path(legacy_json).exists():
+            try:
+                legacy_ids = json.loads(Path(legacy_json).read_text())
+            except json.JSONDecodeError:
+                legacy_ids = []
+            self.path.write_text("".join(str(i) + "\n" for i in dict.fromkeys(str(i) for i in legacy_ids)))
+
+        if self.path.exists():
+            with self.path.open("rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    data = data[: data.rfind(b"\n") + 1]
+                    f.truncate(len(data))
+            self.completed.update(i for i in data.decode("utf-8").splitlines() if i)
+
+        self._file = self.path.open("a", encoding="utf-8")
+        self._unsynced = 0
+
+    def __contains__(self, item) -> bool:
+        return str(item) in self.completed
+
+    def __len__(self) -> int:
+        return len(self.completed)
+
+    def add(self, item):
+        item = str(item)
+        if item in self.completed:
+            return
+        self.completed.add(item)
+        self._file.write(item + "\n")
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _AsyncDownloader:
+    """Streams files to disk over one pooled ``httpx.AsyncClient``, with at most
+    ``per_host`` concurrent downloads from any single host.
+
+    Files are written in chunks to ``<path>.part`` and renamed on completion, so a
+    partially downloaded file never appears at ``path``. The ``.part`` file is removed if
+    the download fails or is cancelled.
+    """
+
+    def __init__(self, per_host: int = 4, max_connections: int = 64, timeout: float = 10, chunk_size: int = 1 << 16):
+        import httpx
+
+        self.per_host = per_host
+        self.chunk_size = chunk_size
+        self._host_semaphores = {}
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, read=6 * timeout),
+            follow_redirects=True,
+        )
+
+    async def download(self, url: str, path: Path):
+        host = self._client.build_request("GET", url).url.host
+        semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+        part_path = path.with_name(path.name + ".part")
+        try:
+            async with semaphore:
+                async with self._client.stream("GET", url) as r:
+                    r.raise_for_status()
+                    with part_path.open("wb") as f:
+                        async for chunk in r.aiter_bytes(self.chunk_size):
+                            f.write(chunk)
+            part_path.replace(path)
+        except BaseException:
+            part_path.unlink(missing_ok=True)
+            raise
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
 def _count_local(source: str):
     ids = []
     data_root = Path(_find_project_root()) / Path("data/")
@@ -267,3 +412,149 @@ def _collect_from_path(path: Path):
             collected_input_files.append(_prep_path(directory))
 
     return collected_input_files
+
+
+SHARD_DIR = "shards"
+SHARD_INDEX = "shard_index.tsv"
+
+
+def _discover_shards(directory: Path) -> list[Path]:
+    """Sorted ``.jsonl.gz`` shards under ``directory/shards``, or an empty list."""
+    return sorted((Path(directory) / SHARD_DIR).glob("*.jsonl.gz"))
+
+
+def _json_bytes(obj, pretty: bool = False) -> bytes:
+    """Serialize ``obj`` as compact UTF-8 JSON, with orjson when it is installed.
+
+    ``pretty`` gives the indented output of ``json.dump(obj, f, indent=4)`` instead.
+    """
+    if pretty:
+        return json.dumps(obj, indent=4).encode("utf-8")
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. integers wider than 64 bits, which the json module still handles
+            pass
+    try:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    except UnicodeEncodeError:
+        # Lone surrogates can't be encoded as UTF-8, but can be escaped as before
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _write_json(path: Path, obj, pretty: bool = False):
+    """Write ``obj`` to ``path`` as JSON, compact unless ``pretty``.
+
+    ``obj`` is serialized before ``path`` is touched, and the file is replaced atomically,
+    so a failure never leaves an empty or partial file behind.
+    """
+    data = _json_bytes(obj, pretty)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    tmp_path.replace(path)
+
+
+def _iter_shard(shard_path: Path):
+    """Yield the records of a ``.jsonl.gz`` shard, one JSON object per line."""
+    with gzip.open(shard_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _write_shard(shard_path: Path, records):
+    """Write ``records`` to a ``.jsonl.gz`` shard, replacing any previous shard atomically."""
+    shard_path.parent.mkdir(exist_ok=True, parents=True)
+    lines = [_json_bytes(record) + b"\n" for record in records]
+    tmp_path = shard_path.with_name(shard_path.name + ".tmp")
+    with gzip.open(tmp_path, "wb") as f:
+        f.writelines(lines)
+    tmp_path.replace(shard_path)
+
+
+def _append_shard_index(directory: Path, corpus_ids, shard_name: str):
+    """Record that each of ``corpus_ids`` was written to ``shard_name``."""
+    with open(Path(directory) / SHARD_INDEX, "a") as f:
+        f.writelines(f"{corpus_id}\t{shard_name}\n" for corpus_id in corpus_ids)
+
+
+def _load_shard_index(directory: Path) -> dict[str, str]:
+    """Map each corpus_id to the name of the shard holding it. Later entries win."""
+    index_path = Path(directory) / SHARD_INDEX
+    index = {}
+    if index_path.exists():
+        with open(index_path, "r") as f:
+            for line in f:
+                corpus_id, sep, shard_name = line.rstrip("\n").partition("\t")
+                if sep:
+                    index[corpus_id] = shard_name
+    return index
+
+
+BATCH_INDEX_SUFFIX = ".idx"
+BATCH_BLOCK_LINES = 1000
+
+
+def _batch_index_path(batch_path: Path) -> Path:
+    return batch_path.with_name(batch_path.name + BATCH_INDEX_SUFFIX)
+
+
+def _append_gzip_blocks(batch_path: Path, lines: list[str], block_lines: int = BATCH_BLOCK_LINES):
+    """Append ``lines`` to a gzip file as independent members of at most ``block_lines`` lines.
+
+    Concatenated gzip members are still one valid gzip stream, so the file reads like any
+    other ``.jsonl.gz``. The byte offset, first line number and line count of each member are
+    appended to the ``<batch>.idx`` sidecar, so readers can seek straight to a block. If the
+    file already existed without a sidecar, none is started, since its line numbers are unknown.
+    """
+    index_path = _batch_index_path(batch_path)
+    write_index = index_path.exists() or not batch_path.exists()
+    blocks = _read_batch_index(batch_path) or []
+    next_line = blocks[-1][1] + blocks[-1][2] if blocks else 1
+
+    new_blocks = []
+    with open(batch_path, "ab") as f:
+        for start in range(0, len(lines), block_lines):
+            block = lines[start : start + block_lines]  # noqa
+            new_blocks.append((f.tell(), next_line + start, len(block)))
+            f.write(gzip.compress("".join(i + "\n" for i in block).encode("utf-8")))
+
+    if write_index:
+        with open(index_path, "a") as f:
+            f.writelines(f"{offset}\t{first_line}\t{n_lines}\n" for offset, first_line, n_lines in new_blocks)
+
+
+def _read_batch_index(batch_path: Path) -> list[tuple[int, int, int]] | None:
+    """``(offset, first_line, n_lines)`` for each block of ``batch_path``, or None without a usable sidecar."""
+    index_path = _batch_index_path(batch_path)
+    if not index_path.exists():
+        return None
+    try:
+        with open(index_path, "r") as f:
+            blocks = [tuple(int(i) for i in line.split("\t")) for line in f if line.strip()]
+    except ValueError:
+        return None
+    size = batch_path.stat().st_size
+    if any(len(i) != 3 or not 0 <= i[0] < size for i in blocks):
+        return None
+    return blocks
+
+
+def _iter_gzip_lines(
+    path: Path, offset: int = 0, first_line: int = 1, n_lines: int | None = None, stride: int = 1, phase: int = 0
+):
+    """Yield ``(line_number, line)`` from a gzip file, starting at the member at byte ``offset``.
+
+    Lines are numbered from ``first_line``. At most ``n_lines`` lines are read, and of those
+    only every ``stride``-th one, starting with the ``phase``-th, is yielded.
+    """
+    with open(path, "rb") as raw:
+        raw.seek(offset)
+        with gzip.open(raw, "rt", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if n_lines is not None and i >= n_lines:
+                    return
+                if i % stride == phase:
+                    yield first_line + i, line